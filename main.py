@@ -1,25 +1,101 @@
+import argparse
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 import redis.asyncio as redis
 import uvicorn
-from fastapi import FastAPI, Depends, HTTPException
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.types import ASGIApp
 
-from sqlalchemy.orm import Session
-from sqlalchemy import text
-
-from src.database.connector import get_db
+from src.database import connector
+from src.middleware.access_log import AccessLogMiddleware, configure_logging
+from src.middleware.compression import CompressionMiddleware, parse_levels
+from src.middleware.load_shedding import LoadSheddingMiddleware, parse_prefix_values
+from src.middleware.tracing import TracingMiddleware, configure_tracing
 from src.routes import contacts, notes, auth, users
+from src.services import email
+from src.services.assets import HashedStaticFiles
+from src.services.auth import auth_service
+from src.services.health import health_monitor
+from src.services.note_batcher import note_batcher
 from src.conf.config import settings
 
-app = FastAPI()
 
+async def warm_up_redis(pool: redis.Redis, min_connections: int) -> None:
+    """
+        open min_connections connections in the redis pool by running concurrent pings
+
+        :param pool: redis client with connection pool
+        :type pool: redis.Redis
+        :param min_connections: number of connections to open
+        :type min_connections: int
+        :return: None
+        :rtype: None
+        """
+    try:
+        await asyncio.gather(*(pool.ping() for _ in range(min_connections)))
+    except redis.RedisError as err:
+        logging.warning("redis warm up failed: %s", err)
+
+
+def find_middleware(app: FastAPI, middleware_class: type) -> ASGIApp | None:
+    """
+        instance of middleware_class in the middleware stack Starlette built for app
+
+        :param app: application
+        :type app: FastAPI
+        :param middleware_class: middleware class added with add_middleware
+        :type middleware_class: type
+        :return: middleware or None if app has none or hasn't served a request yet
+        :rtype: ASGIApp | None
+        """
+    layer = app.middleware_stack
+    while layer is not None and not isinstance(layer, middleware_class):
+        layer = getattr(layer, "app", None)
+    return layer
 
-@app.on_event("startup")
-async def startup():
-    r = await redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0, encoding="utf-8",
-                          decode_responses=True)
-    return r
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    """
+        create shared clients and warm pools before serving, drain them on shutdown.
+        Mail and storage clients are created on first use and dropped here.
+
+        :param _: application
+        :type _: FastAPI
+        """
+    log_listener = configure_logging(settings.log_level)
+    if settings.tracing_exporter:
+        configure_tracing(settings.tracing_exporter, settings.tracing_service_name)
+    redis_pool = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0,
+                             max_connections=settings.redis_max_connections)
+    auth_service.redis_db = redis_pool
+    await asyncio.gather(
+        warm_up_redis(redis_pool, settings.redis_min_connections),
+        asyncio.to_thread(connector.warm_up, settings.database_pool_min_connections),
+        asyncio.to_thread(auth_service.calibrate_password_hash, settings.password_hash_target_ms,
+                          settings.password_hash_min_rounds, settings.password_hash_max_rounds),
+    )
+    syncs = [asyncio.create_task(auth_service.revocation.run_sync(redis_pool)),
+             asyncio.create_task(auth_service.token_versions.run_sync(redis_pool)),
+             asyncio.create_task(health_monitor.run(redis_pool)),
+             asyncio.create_task(connector.replicas.run())]
+    yield
+    for sync in syncs:
+        sync.cancel()
+    await note_batcher.close()
+    auth_service.redis_db = None
+    email.close_mail()
+    await redis_pool.close()
+    await redis_pool.connection_pool.disconnect()
+    await asyncio.to_thread(connector.dispose)
+    log_listener.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 @app.get("/", response_class=HTMLResponse, description="Main Page")
@@ -27,19 +103,33 @@ async def root():
     return {"message": "Welcome to FastAPI homework!"}
 
 
+@app.get("/livez", description="Liveness probe, no I/O")
+async def livez():
+    return {"status": "ok"}
+
+
+@app.get("/readyz", description="Readiness probe, result of the last background health check")
+async def readyz():
+    return JSONResponse(health_monitor.report, status_code=200 if health_monitor.ready else 503)
+
+
+@app.get("/stats", description="Counters of the load shedding and compression middlewares")
+async def stats(request: Request):
+    load_shedding = find_middleware(request.app, LoadSheddingMiddleware)
+    compression = find_middleware(request.app, CompressionMiddleware)
+    return {"load_shedding": load_shedding.stats if load_shedding else None,
+            "compression": compression.stats if compression else None}
+
+
 @app.get("/api/healthchecker")
-def healthchecker(db: Session = Depends(get_db)):
-    try:
-        result = db.execute(text("SELECT 1")).fetchone()
-        if result is None:
-            raise HTTPException(status_code=500, detail="Database is not configured correctly")
-        return {"message": "Welcome to FastAPI!"}
-    except Exception as e:
-        print(e)
+async def healthchecker():
+    if not health_monitor.checks.get("database", {}).get("ok"):
         raise HTTPException(status_code=500, detail="Error connecting to the database")
+    return {"message": "Welcome to FastAPI!"}
 
 
-app.mount("/static", StaticFiles(directory="src/static"), name="static")
+static_files = HashedStaticFiles(directory="src/static")
+app.mount("/static", static_files, name="static")
 
 app.include_router(contacts.router, prefix='/api')
 app.include_router(contacts.finder, prefix='/api')
@@ -53,6 +143,56 @@ app.add_middleware(CORSMiddleware,
                    allow_methods=["*"],
                    allow_headers=["*"],
                    )
+app.add_middleware(LoadSheddingMiddleware,
+                   max_in_flight=settings.load_max_in_flight,
+                   max_queue=settings.load_max_queue,
+                   timeout=settings.request_timeout,
+                   route_timeouts=parse_prefix_values(settings.request_route_timeouts),
+                   retry_after=settings.load_retry_after,
+                   )
+app.add_middleware(CompressionMiddleware,
+                   minimum_size=settings.compression_minimum_size,
+                   levels=parse_levels(settings.compression_levels),
+                   )
+app.add_middleware(AccessLogMiddleware,
+                   sample_rates=parse_prefix_values(settings.access_log_sample_rates),
+                   slow_ms=settings.access_log_slow_ms,
+                   )
+app.add_middleware(TracingMiddleware)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """
+        command line options of the server
+
+        :param argv: arguments, sys.argv by default
+        :type argv: List[str] | None
+        :return: parsed options
+        :rtype: argparse.Namespace
+        """
+    parser = argparse.ArgumentParser(description="HW fourteen API server")
+    parser.add_argument("--prod", action="store_true", help="run production workers instead of the dev reloader")
+    parser.add_argument("--host", default=None, help="interface to bind")
+    parser.add_argument("--port", type=int, default=settings.server_port)
+    parser.add_argument("--workers", type=int, default=settings.server_workers or None,
+                        help="number of workers, defaults to the number of CPUs")
+    parser.add_argument("--keep-alive", type=int, default=settings.server_keep_alive)
+    parser.add_argument("--backlog", type=int, default=settings.server_backlog)
+    parser.add_argument("--limit-concurrency", type=int, default=settings.server_limit_concurrency or None)
+    parser.add_argument("--graceful-timeout", type=int, default=settings.server_graceful_timeout)
+    parser.add_argument("--preload", action="store_true", help="import the app once before forking workers")
+    return parser.parse_args(argv)
+
 
 if __name__ == '__main__':
-    uvicorn.run("main:app", host="localhost", reload=True, log_level="info")
+    args = parse_args()
+    if args.prod:
+        from src.server import default_workers, run_production
+
+        run_production(host=args.host or settings.server_host, port=args.port,
+                       workers=args.workers or default_workers(), keep_alive=args.keep_alive,
+                       backlog=args.backlog, limit_concurrency=args.limit_concurrency,
+                       graceful_timeout=args.graceful_timeout, preload=args.preload)
+    else:
+        uvicorn.run("main:app", host=args.host or "localhost", port=args.port, reload=True, log_level="info",
+                    access_log=False)
@@ -0,0 +1,30 @@
+"""notes timestamps
+
+Revision ID: 5d3a7e91c04b
+Revises: 8b1f4c2d9e7a
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d3a7e91c04b'
+down_revision: Union[str, None] = '8b1f4c2d9e7a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('notes', sa.Column('created_at', sa.DateTime(), nullable=True))
+    op.add_column('notes', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_notes_user_id_contact_id_id', 'notes', ['user_id', 'contact_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notes_user_id_contact_id_id', table_name='notes')
+    op.drop_column('notes', 'updated_at')
+    op.drop_column('notes', 'created_at')
@@ -0,0 +1,29 @@
+"""notes full text search
+
+Revision ID: 8b1f4c2d9e7a
+Revises: 327fa25666f9
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b1f4c2d9e7a'
+down_revision: Union[str, None] = '327fa25666f9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE notes ADD COLUMN text_search tsvector "
+               "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(text, ''))) STORED")
+    op.create_index('ix_notes_text_search', 'notes', ['text_search'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notes_text_search', table_name='notes', postgresql_using='gin')
+    op.drop_column('notes', 'text_search')
@@ -0,0 +1,31 @@
+"""contacts notes count
+
+Revision ID: b7e2f0a13c58
+Revises: 5d3a7e91c04b
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2f0a13c58'
+down_revision: Union[str, None] = '5d3a7e91c04b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('notes_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute("UPDATE contacts SET notes_count = counts.notes_count "
+               "FROM (SELECT contact_id, count(id) AS notes_count FROM notes GROUP BY contact_id) AS counts "
+               "WHERE contacts.id = counts.contact_id")
+    op.create_index('ix_contacts_user_id_notes_count', 'contacts', ['user_id', 'notes_count'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_notes_count', table_name='contacts')
+    op.drop_column('contacts', 'notes_count')
@@ -1,2 +1,4 @@
 INVALID_SCOPE_TOKEN = "Invalid scope for token"
 CLOUD_NOT_VALIDATE = "Could not validate credentials"
+INVALID_REFRESH_TOKEN = "Invalid refresh token"
+TOKEN_STORAGE_UNAVAILABLE = "Token storage unavailable"
@@ -1,24 +1,290 @@
+import asyncio
+import itertools
+import logging
+import time
+
 from fastapi import HTTPException, status
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.sql.dml import UpdateBase
 
 
 from src.conf.config import settings
+from src.database import shards
+from src.middleware import access_log, load_shedding, tracing
 
+logger = logging.getLogger(__name__)
 
 SQLALCHEMY_DATABASE_URL = settings.database_url
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-DBSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Postgres error code of a statement cancelled by statement_timeout
+QUERY_CANCELED = "57014"
+_engine: Engine | None = None
 
 
-# Dependency
-def get_db():
-    db = DBSession()
+def get_engine() -> Engine:
+    """
+        primary engine, created on first use so importing the app opens nothing and loads no db driver
+
+        :return: primary engine
+        :rtype: Engine
+        """
+    global _engine
+    if _engine is None:
+        _engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    return _engine
+
+
+class ReplicaPool:
+    """
+        Round-robin over the read replica engines, skipping the ones that failed a health check.
+        Health checks run in the background from run, picking a replica only reads the healthy list.
+
+        :param urls: database urls of the replicas
+        :type urls: List[str]
+        :param check_interval: seconds between health checks of all replicas
+        :type check_interval: int
+        """
+
+    def __init__(self, urls, check_interval: int):
+        self.urls = urls
+        self.check_interval = check_interval
+        self.healthy = []
+        self._engines = None
+        self._counter = itertools.count()
+
+    @property
+    def engines(self):
+        if self._engines is None:
+            self._engines = [create_engine(url, pool_pre_ping=True) for url in self.urls]
+            for replica in self._engines:
+                event.listen(replica, "handle_error", self._on_error)
+            self.healthy = list(self._engines)
+        return self._engines
+
+    def _on_error(self, context):
+        if context.is_disconnect and context.engine is not None:
+            self.mark_down(context.engine)
+
+    def mark_down(self, replica: Engine) -> None:
+        """
+            exclude replica from routing until the next health check
+
+            :param replica: engine of the failed replica
+            :type replica: Engine
+            :return: None
+            :rtype: None
+            """
+        if replica in self.healthy:
+            logger.warning("replica %s marked down", replica.url.render_as_string(hide_password=True))
+            self.healthy = [e for e in self.healthy if e is not replica]
+
+    def check(self) -> None:
+        """
+            ping every replica and rebuild the list of healthy ones
+
+            :return: None
+            :rtype: None
+            """
+        healthy = []
+        for replica in self.engines:
+            try:
+                with replica.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+            except SQLAlchemyError as err:
+                logger.warning("replica %s failed health check: %s",
+                               replica.url.render_as_string(hide_password=True), err)
+            else:
+                healthy.append(replica)
+        self.healthy = healthy
+
+    async def run(self) -> None:
+        """
+            check every check_interval seconds forever, run as a background task
+
+            :return: None
+            :rtype: None
+            """
+        if not self.engines:
+            return
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await asyncio.to_thread(self.check)
+            except Exception as err:
+                logger.warning("replica health check failed: %s", err)
+
+    def next(self) -> Engine | None:
+        """
+            next healthy replica in round-robin order
+
+            :return: replica engine or None if no replica is available
+            :rtype: Engine | None
+            """
+        if not self.engines:
+            return None
+        healthy = self.healthy
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)]
+
+
+replicas = ReplicaPool([url.strip() for url in settings.database_replica_urls.split(",") if url.strip()],
+                       settings.database_replica_check_interval)
+
+
+class RoutingSession(Session):
+    """
+        Session that sends reads of a read-only request to a replica, the same one while it stays healthy.
+        Writes, and every statement after the first write, go to the primary,
+        so a request always reads its own writes.
+        With shards configured, statements on contacts and notes, and plain SQL text, go to the shard
+        of info["shard"] or of the current user; users and the shard directory stay on the primary.
+        """
+
+    def __init__(self, *args, read_only: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.read_only = read_only
+        self.wrote = False
+
+    def _shard_bind(self, mapper) -> Engine | None:
+        if not shards.router.enabled:
+            return None
+        if mapper is not None and mapper.local_table.name not in shards.SHARDED_TABLES:
+            return None
+        name = self.info.get("shard")
+        if name is None:
+            user_id = self.info.get("user_id", shards.current_user_id.get())
+            if user_id is None:
+                return None
+            name = shards.router.shard_for(user_id, get_engine())
+        return shards.router.engine(name)
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.wrote = True
+        shard = self._shard_bind(mapper)
+        if shard is not None:
+            return shard
+        if self.read_only and not self.wrote:
+            # one replica for the whole session, so its reads see a single replication lag
+            replica = self.info.get("replica")
+            if replica is None or replica not in replicas.healthy:
+                replica = self.info["replica"] = replicas.next()
+            if replica is not None:
+                return replica
+        return get_engine()
+
+
+def apply_deadline(session: Session, transaction, connection) -> None:
+    """
+        bound every statement of a Postgres transaction by the time left until the request deadline
+
+        :param session: session beginning the transaction
+        :type session: Session
+        :param transaction: session transaction
+        :param connection: connection the transaction runs on
+        :type connection: Connection
+        :return: None
+        :rtype: None
+        """
+    left = load_shedding.remaining()
+    if left is not None and connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {max(int(left * 1000), 1)}")
+
+
+event.listen(RoutingSession, "after_begin", apply_deadline)
+
+
+# start time and span live on the execution context, so a failed statement leaves nothing behind on the connection
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if context is None:
+        return
+    query_span = tracing.start_span(statement.split(None, 1)[0].upper(), **{
+        "db.system": conn.dialect.name, "db.statement": statement})
+    context.query_timing = (time.perf_counter(), query_span)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started, query_span = getattr(context, "query_timing", (None, None))
+    if started is None:
+        return
+    del context.query_timing
+    query_span.end()
+    access_log.record("db_ms", (time.perf_counter() - started) * 1000)
+    access_log.record("db_queries")
+
+
+def _handle_error(context) -> None:
+    _, query_span = getattr(context.execution_context, "query_timing", (None, None))
+    if query_span is not None:
+        del context.execution_context.query_timing
+        tracing.fail(query_span, context.original_exception)
+        query_span.end()
+
+
+# every statement of every engine is timed for the access log of the current request and traced
+event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+event.listen(Engine, "handle_error", _handle_error)
+
+
+def warm_up(min_connections: int) -> None:
+    """
+        open min_connections connections in the primary, replica and shard pools so first requests find them ready
+
+        :param min_connections: number of connections to open in every pool
+        :type min_connections: int
+        :return: None
+        :rtype: None
+        """
+    for bind in [get_engine(), *replicas.engines, *shards.router.engines]:
+        connections = []
+        try:
+            for _ in range(min_connections):
+                connections.append(bind.connect())
+        except SQLAlchemyError as err:
+            logger.warning("pool warm up failed for %s: %s", bind.url.render_as_string(hide_password=True), err)
+        finally:
+            for conn in connections:
+                conn.close()
+
+
+def dispose() -> None:
+    """
+        close all pooled connections of the primary, replica and shard engines
+
+        :return: None
+        :rtype: None
+        """
+    if _engine is not None:
+        _engine.dispose()
+    for replica in replicas._engines or []:
+        replica.dispose()
+    shards.router.dispose()
+
+
+DBSession = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False)
+
+
+def _session_scope(db: Session):
     try:
         yield db
     except SQLAlchemyError as err_sql:
         db.rollback()
+        if isinstance(err_sql, OperationalError) and getattr(err_sql.orig, "pgcode", None) == QUERY_CANCELED:
+            raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Request deadline exceeded")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err_sql))
     finally:
         db.close()
+
+
+# Dependency
+def get_db():
+    yield from _session_scope(DBSession())
+
+
+# Dependency for read-only routes
+def get_read_db():
+    yield from _session_scope(DBSession(read_only=True))
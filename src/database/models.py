@@ -1,6 +1,6 @@
 from datetime import date
 
-from sqlalchemy import ForeignKey, String, Integer, DateTime, func, Boolean
+from sqlalchemy import ForeignKey, String, Integer, DateTime, func, Boolean, DDL, event, Index
 from sqlalchemy.orm import relationship, declarative_base, Mapped, mapped_column
 
 Base = declarative_base()
@@ -8,6 +8,7 @@ Base = declarative_base()
 
 class Contact(Base):
     __tablename__ = 'contacts'
+    __table_args__ = (Index('ix_contacts_user_id_notes_count', 'user_id', 'notes_count'),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     first_name: Mapped[str] = mapped_column(String(50), index=True)
     last_name: Mapped[str] = mapped_column(String(80), index=True)
@@ -17,20 +18,59 @@ class Contact(Base):
     created_at: Mapped[date] = mapped_column('created_at', DateTime, default=func.now(), nullable=True)
     updated_at: Mapped[date] = mapped_column('updated_at', DateTime, default=func.now(), onupdate=func.now(),
                                              nullable=True)
+    notes_count: Mapped[int] = mapped_column(Integer, default=0, server_default='0', nullable=False)
     user_id: Mapped[int] = mapped_column('user_id', ForeignKey('users.id', ondelete='CASCADE'), default=None)
     user: Mapped[str] = relationship('User', backref='contacts')
 
 
 class Note(Base):
     __tablename__ = 'notes'
+    __table_args__ = (Index('ix_notes_user_id_contact_id_id', 'user_id', 'contact_id', 'id'),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     contact_id: Mapped[int] = mapped_column(Integer, ForeignKey('contacts.id'), nullable=False)
     text: Mapped[str] = mapped_column(String)
     contact: Mapped[str] = relationship("Contact", backref='notes')
+    created_at: Mapped[date] = mapped_column('created_at', DateTime, default=func.now(), nullable=True)
+    updated_at: Mapped[date] = mapped_column('updated_at', DateTime, default=func.now(), onupdate=func.now(),
+                                             nullable=True)
     user_id: Mapped[int] = mapped_column('user_id', ForeignKey('users.id', ondelete='CASCADE'), default=None)
     user: Mapped[str] = relationship('User', backref='notes')
 
 
+def attach_notes_search(table) -> None:
+    """
+        full-text search over notes: generated tsvector column with GIN index on Postgres,
+        external content FTS5 table kept in sync by triggers on SQLite
+
+        :param table: notes table
+        :type table: Table
+        :return: None
+        :rtype: None
+        """
+    for ddl in (
+        "ALTER TABLE notes ADD COLUMN text_search tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(text, ''))) STORED",
+        "CREATE INDEX ix_notes_text_search ON notes USING GIN (text_search)",
+    ):
+        event.listen(table, "after_create", DDL(ddl).execute_if(dialect="postgresql"))
+
+    for ddl in (
+        "CREATE VIRTUAL TABLE notes_fts USING fts5(text, content='notes', content_rowid='id')",
+        "CREATE TRIGGER notes_fts_insert AFTER INSERT ON notes BEGIN "
+        "INSERT INTO notes_fts(rowid, text) VALUES (new.id, new.text); END",
+        "CREATE TRIGGER notes_fts_delete AFTER DELETE ON notes BEGIN "
+        "INSERT INTO notes_fts(notes_fts, rowid, text) VALUES ('delete', old.id, old.text); END",
+        "CREATE TRIGGER notes_fts_update AFTER UPDATE OF text ON notes BEGIN "
+        "INSERT INTO notes_fts(notes_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+        "INSERT INTO notes_fts(rowid, text) VALUES (new.id, new.text); END",
+    ):
+        event.listen(table, "after_create", DDL(ddl).execute_if(dialect="sqlite"))
+    event.listen(table, "before_drop", DDL("DROP TABLE IF EXISTS notes_fts").execute_if(dialect="sqlite"))
+
+
+attach_notes_search(Note.__table__)
+
+
 class User(Base):
     __tablename__ = 'users'
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -42,3 +82,9 @@ class User(Base):
     refresh_token: Mapped[str] = mapped_column(String(255), nullable=True)
     avatar: Mapped[str] = mapped_column(String(255), nullable=True)
     confirmed: Mapped[bool] = mapped_column(Boolean, default=False)
+
+
+class ShardDirectory(Base):
+    __tablename__ = 'shard_directory'
+    user_id: Mapped[int] = mapped_column('user_id', ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    shard: Mapped[str] = mapped_column(String(50), nullable=False)
@@ -0,0 +1,199 @@
+import bisect
+import hashlib
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Dict, List
+
+from sqlalchemy import MetaData, create_engine, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from src.conf.config import settings
+from src.database.models import Contact, Note, ShardDirectory, attach_notes_search
+
+SHARDED_TABLES = frozenset({Contact.__tablename__, Note.__tablename__})
+DIRECTORY_CACHE_SIZE = 100000
+
+# owner of the data the current request works with, set by auth
+current_user_id: ContextVar[int | None] = ContextVar("current_user_id", default=None)
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+        consistent hashing of keys to names, adding a name moves only about 1/n of the keys
+
+        :param names: shard names
+        :type names: List[str]
+        :param vnodes: points on the ring per name, more points spread keys more evenly
+        :type vnodes: int
+        """
+
+    def __init__(self, names: List[str], vnodes: int = 64):
+        points = sorted((_hash(f"{name}#{i}"), name) for name in names for i in range(vnodes))
+        self._points = [point for point, _ in points]
+        self._names = [name for _, name in points]
+
+    def lookup(self, key: str) -> str:
+        """
+            name owning key, the first point clockwise from the hash of key
+
+            :param key: key to place
+            :type key: str
+            :return: shard name
+            :rtype: str
+            """
+        return self._names[bisect.bisect(self._points, _hash(key)) % len(self._points)]
+
+
+class ShardRouter:
+    """
+        maps users to shard databases holding their contacts and notes.
+        Users stay on the primary database, their shard is the one pinned in shard_directory
+        or else the one picked by the hash ring. Directory lookups are cached for directory_ttl seconds.
+
+        :param urls: database url by shard name, empty to keep everything on the primary
+        :type urls: Dict[str, str]
+        :param directory_ttl: seconds to cache directory lookups
+        :type directory_ttl: int
+        """
+
+    def __init__(self, urls: Dict[str, str], directory_ttl: int):
+        self.urls = urls
+        self.directory_ttl = directory_ttl
+        self.ring = HashRing(list(urls)) if urls else None
+        self._engines = {}
+        self._directory = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.urls)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.urls)
+
+    @property
+    def targets(self) -> List[str | None]:
+        """
+            values for session info["shard"] covering all contacts and notes, for jobs working across users
+
+            :return: shard names or [None] for the primary when sharding is off
+            :rtype: List[str | None]
+            """
+        return self.names or [None]
+
+    @property
+    def engines(self) -> List[Engine]:
+        return [self.engine(name) for name in self.urls]
+
+    def engine(self, name: str) -> Engine:
+        """
+            engine of shard, created on first use
+
+            :param name: shard name
+            :type name: str
+            :return: shard engine
+            :rtype: Engine
+            """
+        if name not in self._engines:
+            self._engines[name] = create_engine(self.urls[name], pool_pre_ping=True)
+        return self._engines[name]
+
+    def shard_for(self, user_id: int, primary: Engine) -> str:
+        """
+            shard of user
+
+            :param user_id: user id
+            :type user_id: int
+            :param primary: engine of the database with shard_directory
+            :type primary: Engine
+            :return: shard name
+            :rtype: str
+            """
+        cached = self._directory.get(user_id)
+        if cached is not None and cached[1] > time.monotonic():
+            self._directory.move_to_end(user_id)
+            return cached[0]
+        with primary.connect() as conn:
+            name = conn.execute(select(ShardDirectory.shard).where(ShardDirectory.user_id == user_id)).scalar()
+        if name not in self.urls:
+            name = self.ring.lookup(str(user_id))
+        self._directory[user_id] = (name, time.monotonic() + self.directory_ttl)
+        self._directory.move_to_end(user_id)
+        if len(self._directory) > DIRECTORY_CACHE_SIZE:
+            self._directory.popitem(last=False)
+        return name
+
+    def assign(self, user_id: int, name: str, db: Session) -> None:
+        """
+            pin user to shard, call after user's contacts and notes are copied there.
+            Other workers follow once their cached lookup expires.
+
+            :param user_id: user id
+            :type user_id: int
+            :param name: shard name
+            :type name: str
+            :param db: session to the primary database
+            :type db: Session
+            :return: None
+            :rtype: None
+            """
+        if name not in self.urls:
+            raise ValueError(f"unknown shard {name}")
+        db.merge(ShardDirectory(user_id=user_id, shard=name))
+        db.commit()
+        self._directory.pop(user_id, None)
+
+    def dispose(self) -> None:
+        """
+            close all pooled connections of shard engines
+
+            :return: None
+            :rtype: None
+            """
+        for engine in self._engines.values():
+            engine.dispose()
+
+
+def parse_urls(value: str) -> Dict[str, str]:
+    """
+        parse shard urls setting
+
+        :param value: comma separated name=url pairs
+        :type value: str
+        :return: url by shard name
+        :rtype: Dict[str, str]
+        """
+    pairs = (item.strip().partition("=") for item in value.split(",") if item.strip())
+    return {name.strip(): url.strip() for name, _, url in pairs}
+
+
+def create_shard_schema(engine: Engine) -> None:
+    """
+        create contacts and notes tables in a shard, without foreign keys to users living on the primary
+
+        :param engine: shard engine
+        :type engine: Engine
+        :return: None
+        :rtype: None
+        """
+    metadata = MetaData()
+    for table in (Contact.__table__, Note.__table__):
+        copy = table.to_metadata(metadata)
+        for constraint in list(copy.foreign_key_constraints):
+            if constraint.elements[0].target_fullname.startswith("users."):
+                copy.constraints.discard(constraint)
+                copy.foreign_keys.difference_update(constraint.elements)
+                for column in constraint.columns:
+                    column.foreign_keys.difference_update(constraint.elements)
+        if table is Note.__table__:
+            attach_notes_search(copy)
+    metadata.create_all(engine)
+
+
+router = ShardRouter(parse_urls(settings.database_shard_urls), settings.database_shard_directory_ttl)
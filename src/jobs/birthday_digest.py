@@ -0,0 +1,103 @@
+import argparse
+import asyncio
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import List
+
+import redis.asyncio as redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import settings
+from src.database import shards
+from src.database.connector import DBSession
+from src.repository import contacts as repository_contact
+from src.repository import users as repository_user
+from src.services import birthdays, email
+
+
+async def build_digest(today: date, sessions: List[AsyncSession], redis_db: redis.Redis,
+                       send_email: bool = False) -> int:
+    """
+        store upcoming birthdays of all users found in one query per shard, optionally mail every user a digest
+
+        :param today: day of the digest
+        :type today: date
+        :param sessions: sessions covering all contacts, one per shard
+        :type sessions: List[AsyncSession]
+        :param redis_db: redis client
+        :type redis_db: redis.Redis
+        :param send_email: send digest emails
+        :type send_email: bool
+        :return: number of users with upcoming birthdays
+        :rtype: int
+        """
+    started = datetime.now().timestamp()
+    contacts_by_user = defaultdict(list)
+    for db in sessions:
+        for contact in await repository_contact.upcoming_birthdays(today, birthdays.DIGEST_DAYS, db):
+            contacts_by_user[contact.user_id].append(contact)
+    await birthdays.store_digest(today, contacts_by_user, redis_db, started)
+    if send_email and contacts_by_user:
+        for user in await repository_user.get_users_by_ids(list(contacts_by_user), sessions[0]):
+            await email.send_birthday_digest(user.email, user.name, contacts_by_user[user.id])
+    return len(contacts_by_user)
+
+
+def seconds_until_midnight() -> float:
+    """
+        time left until the digest of the next day is due
+
+        :return: seconds to the next local midnight
+        :rtype: float
+        """
+    now = datetime.now()
+    return (datetime.combine(now.date() + timedelta(days=1), time.min) - now).total_seconds()
+
+
+async def run(forever: bool, send_email: bool) -> None:
+    """
+        build today's digest, with forever rebuild it after every midnight
+
+        :param forever: keep running
+        :type forever: bool
+        :param send_email: send digest emails
+        :type send_email: bool
+        :return: None
+        :rtype: None
+        """
+    redis_db = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+    try:
+        while True:
+            sessions = [DBSession(read_only=True, info={"shard": name}) for name in shards.router.targets]
+            try:
+                users = await build_digest(date.today(), sessions, redis_db, send_email)
+            finally:
+                for db in sessions:
+                    db.close()
+            print(f"birthday digest stored for {users} users")
+            if not forever:
+                break
+            await asyncio.sleep(seconds_until_midnight() + 1)
+    finally:
+        await redis_db.close()
+
+
+def main(argv: list[str] | None = None) -> None:
+    """
+        daily birthday digest job, run with python -m src.jobs.birthday_digest from cron after midnight
+        or with --forever as a long running worker
+
+        :param argv: command line arguments
+        :type argv: list[str] | None
+        :return: None
+        :rtype: None
+        """
+    parser = argparse.ArgumentParser(description="Store upcoming birthdays of all users in redis")
+    parser.add_argument("--forever", action="store_true", help="rebuild the digest after every midnight")
+    parser.add_argument("--email", action="store_true", help="send digest emails")
+    args = parser.parse_args(argv)
+    asyncio.run(run(args.forever, args.email))
+
+
+if __name__ == '__main__':
+    main()
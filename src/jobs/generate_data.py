@@ -0,0 +1,206 @@
+import argparse
+import csv
+import io
+import random
+import time
+from datetime import date, timedelta
+from typing import Iterable, List, Sequence
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Connection, Engine
+
+from src.conf.config import settings
+from src.database.models import Base
+
+FIRST_NAMES = ("Olena", "Andrii", "Iryna", "Dmytro", "Oksana", "Taras", "Natalia", "Serhii", "Maria", "Oleksandr",
+               "Anna", "Mykola", "Yulia", "Ivan", "Kateryna", "Petro", "Sofia", "Bohdan", "Daria", "Maksym")
+LAST_NAMES = ("Shevchenko", "Kovalenko", "Bondarenko", "Tkachenko", "Kravchenko", "Melnyk", "Boyko", "Koval",
+              "Oliynyk", "Lysenko", "Marchenko", "Rudenko", "Savchenko", "Petrenko", "Moroz", "Pavlenko")
+WORDS = ("call", "meet", "birthday", "gift", "lunch", "project", "review", "invoice", "trip", "remind", "book",
+         "tickets", "doctor", "friday", "weekend", "send", "photos", "coffee", "plan", "notes")
+# phone formats accepted by ContactModel, {} stands for a digit
+PHONE_FORMATS = ("{}{}{}-{}{}{}-{}{}-{}{}", "{}{}{}-{}{}{}-{}{}{}{}", "({}{}{}){}{}{}-{}{}-{}{}",
+                 "({}{}{}){}{}{}-{}{}{}{}", "({}{}{}){}{}{}{}{}{}{}", "{}{}{}{}{}{}{}{}{}{}",
+                 "+{}{}{}{}{}{}{}{}{}{}{}{}")
+USER_COLUMNS = ("id", "name", "email", "password", "created_at", "updated_at", "confirmed")
+CONTACT_COLUMNS = ("id", "first_name", "last_name", "email", "phone", "birthday", "created_at", "updated_at",
+                   "notes_count", "user_id")
+NOTE_COLUMNS = ("id", "contact_id", "text", "created_at", "updated_at", "user_id")
+
+
+def phone(rng: random.Random) -> str:
+    """
+        :return: phone number in one of the formats accepted by ContactModel
+        :rtype: str
+        """
+    template = rng.choice(PHONE_FORMATS)
+    digits = template.count("{}")
+    return template.format(*str(rng.randrange(10 ** digits)).zfill(digits))
+
+
+def birthday(rng: random.Random, today: date) -> str:
+    """
+        birthday of an adult-skewed population: age normal around 38 with deviation 15, clipped to 1..95,
+        day of year uniform
+
+        :return: birthday at midnight in the text form both COPY and SQLite DateTime columns read
+        :rtype: str
+        """
+    age = min(max(rng.gauss(38, 15), 1), 95)
+    return f"{today - timedelta(days=int(age * 365.25))} 00:00:00.000000"
+
+
+def load_rows(conn: Connection, table: str, columns: Sequence[str], rows: List[tuple]) -> None:
+    """
+        write rows with COPY on Postgres and one executemany elsewhere
+
+        :param conn: connection in a transaction
+        :type conn: Connection
+        :param table: table name
+        :type table: str
+        :param columns: column names in row order
+        :type columns: Sequence[str]
+        :param rows: rows
+        :type rows: List[tuple]
+        :return: None
+        :rtype: None
+        """
+    if not rows:
+        return
+    if conn.dialect.name == "postgresql":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        cursor = conn.connection.dbapi_connection.cursor()
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        cursor.close()
+    else:
+        placeholders = ", ".join("?" if conn.dialect.paramstyle == "qmark" else "%s" for _ in columns)
+        conn.exec_driver_sql(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+
+
+def _next_id(conn: Connection, table: str) -> int:
+    return conn.execute(text(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}")).scalar_one()
+
+
+def generate(engine: Engine, users: int, contacts_per_user: int, notes_per_contact: int, seed: int = 0,
+             batch_size: int = 50000, password: str = "password") -> dict:
+    """
+        append users, their contacts and notes with ids after the existing ones.
+        The same seed gives the same rows; contacts per user and notes per contact vary
+        uniformly from 0 to twice the average, notes_count matches the generated notes.
+        Every user gets the same password, hashed once.
+
+        :param engine: database to fill
+        :type engine: Engine
+        :param users: number of users
+        :type users: int
+        :param contacts_per_user: average contacts per user
+        :type contacts_per_user: int
+        :param notes_per_contact: average notes per contact
+        :type notes_per_contact: int
+        :param seed: random seed
+        :type seed: int
+        :param batch_size: rows written at once
+        :type batch_size: int
+        :param password: password of every user
+        :type password: str
+        :return: rows written by table and seconds taken
+        :rtype: dict
+        """
+    from src.services.auth import auth_service
+
+    password_hash = auth_service.get_hash(password)
+    started = time.perf_counter()
+    today = date(2023, 9, 1)
+    now = f"{today} 00:00:00.000000"
+    rng = random.Random(seed)
+    # a pool of texts instead of joining words per note, the slowest part of generating rows
+    texts = [" ".join(rng.choices(WORDS, k=rng.randint(3, 12))) for _ in range(4096)]
+    counts = {"users": 0, "contacts": 0, "notes": 0}
+    with engine.begin() as conn:
+        user_id, contact_id, note_id = (_next_id(conn, table) for table in ("users", "contacts", "notes"))
+        fts_trigger = None
+        if conn.dialect.name == "sqlite":
+            conn.exec_driver_sql("PRAGMA synchronous = OFF")
+            # indexing notes one by one from the trigger takes most of the load, they are indexed at once below
+            fts_trigger = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type = 'trigger' "
+                                               "AND name = 'notes_fts_insert'").scalar()
+            if fts_trigger:
+                conn.exec_driver_sql("DROP TRIGGER notes_fts_insert")
+        user_rows = []
+        for uid in range(user_id, user_id + users):
+            user_rows.append((uid, f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", f"user{uid}@example.com",
+                              password_hash, now, now, True))
+            if len(user_rows) >= batch_size:
+                load_rows(conn, "users", USER_COLUMNS, user_rows)
+                counts["users"] += len(user_rows)
+                user_rows = []
+        load_rows(conn, "users", USER_COLUMNS, user_rows)
+        counts["users"] += len(user_rows)
+
+        contact_rows, note_rows = [], []
+        for uid in range(user_id, user_id + users):
+            for _ in range(rng.randint(0, 2 * contacts_per_user)):
+                first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                notes = rng.randint(0, 2 * notes_per_contact)
+                contact_rows.append((contact_id, first_name, last_name,
+                                     f"{first_name.lower()}.{last_name.lower()}.{contact_id}@example.com",
+                                     phone(rng), birthday(rng, today), now, now, notes, uid))
+                for _ in range(notes):
+                    note_rows.append((note_id, contact_id, rng.choice(texts), now, now, uid))
+                    note_id += 1
+                contact_id += 1
+            if len(contact_rows) >= batch_size or len(note_rows) >= batch_size:
+                # contacts first, their notes reference them
+                load_rows(conn, "contacts", CONTACT_COLUMNS, contact_rows)
+                load_rows(conn, "notes", NOTE_COLUMNS, note_rows)
+                counts["contacts"] += len(contact_rows)
+                counts["notes"] += len(note_rows)
+                contact_rows, note_rows = [], []
+        load_rows(conn, "contacts", CONTACT_COLUMNS, contact_rows)
+        load_rows(conn, "notes", NOTE_COLUMNS, note_rows)
+        counts["contacts"] += len(contact_rows)
+        counts["notes"] += len(note_rows)
+        if fts_trigger:
+            conn.execute(text("INSERT INTO notes_fts(rowid, text) SELECT id, text FROM notes WHERE id >= :first"),
+                         {"first": note_id - counts["notes"]})
+            conn.exec_driver_sql(fts_trigger)
+        if conn.dialect.name == "postgresql":
+            for table in ("users", "contacts", "notes"):
+                conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                                  f"(SELECT MAX(id) FROM {table}))"))
+    counts["seconds"] = round(time.perf_counter() - started, 3)
+    return counts
+
+
+def main(argv: Iterable[str] | None = None) -> None:
+    """
+        fill a database with synthetic users, contacts and notes for load testing,
+        run with python -m src.jobs.generate_data --users 100000
+
+        :param argv: command line arguments
+        :type argv: Iterable[str] | None
+        :return: None
+        :rtype: None
+        """
+    parser = argparse.ArgumentParser(description="Generate synthetic users, contacts and notes")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--contacts-per-user", type=int, default=20, help="average, actual count varies per user")
+    parser.add_argument("--notes-per-contact", type=int, default=3, help="average, actual count varies per contact")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=50000, help="rows written at once")
+    parser.add_argument("--url", default=settings.database_url, help="database url, DATABASE_URL by default")
+    parser.add_argument("--create", action="store_true", help="create missing tables first")
+    args = parser.parse_args(argv)
+    engine = create_engine(args.url)
+    if args.create:
+        Base.metadata.create_all(engine)
+    counts = generate(engine, args.users, args.contacts_per_user, args.notes_per_contact, args.seed, args.batch_size)
+    rows = counts["users"] + counts["contacts"] + counts["notes"]
+    print(f"{counts['users']} users, {counts['contacts']} contacts, {counts['notes']} notes "
+          f"in {counts['seconds']}s, {rows / max(counts['seconds'], 0.001):.0f} rows/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import gzip
+import mimetypes
+import os
+
+from src.middleware.compression import DEFAULT_LEVELS, brotli
+from src.services.assets import VARIANTS
+
+
+def precompress(directory: str) -> int:
+    """
+        write .br and .gz next to every compressible file of directory that is missing or older than its source,
+        variants not smaller than the file are skipped
+
+        :param directory: static directory
+        :type directory: str
+        :return: number of written variants
+        :rtype: int
+        """
+    compressors = {"gzip": lambda data: gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressors["br"] = lambda data: brotli.compress(data, quality=11)
+    suffixes = tuple(suffix for _, suffix in VARIANTS)
+    written = 0
+    for root, _, files in os.walk(directory):
+        for file in files:
+            path = os.path.join(root, file)
+            media_type = mimetypes.guess_type(path)[0] or ""
+            if file.endswith(suffixes) or not any(media_type.startswith(prefix) for prefix in DEFAULT_LEVELS):
+                continue
+            mtime = os.stat(path).st_mtime
+            with open(path, "rb") as fh:
+                data = fh.read()
+            for encoding, suffix in VARIANTS:
+                target = path + suffix
+                if encoding not in compressors or os.path.exists(target) and os.stat(target).st_mtime >= mtime:
+                    continue
+                compressed = compressors[encoding](data)
+                if len(compressed) < len(data):
+                    with open(target, "wb") as fh:
+                        fh.write(compressed)
+                    written += 1
+    return written
+
+
+def main(argv: list[str] | None = None) -> None:
+    """
+        build step writing precompressed static files, run with python -m src.jobs.precompress_static
+
+        :param argv: command line arguments
+        :type argv: list[str] | None
+        :return: None
+        :rtype: None
+        """
+    parser = argparse.ArgumentParser(description="Write .br and .gz variants of static files")
+    parser.add_argument("directory", nargs="?", default="src/static", help="static directory")
+    args = parser.parse_args(argv)
+    print(f"{precompress(args.directory)} precompressed files written")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+import asyncio
+
+from src.database import shards
+from src.database.connector import DBSession
+from src.repository import contacts as repository_contact
+
+
+def main() -> None:
+    """
+        repair job for contacts.notes_count on every shard, run with python -m src.jobs.recount_notes
+
+        :return: None
+        :rtype: None
+        """
+    fixed = 0
+    for name in shards.router.targets:
+        db = DBSession(info={"shard": name})
+        try:
+            fixed += asyncio.run(repository_contact.recount_notes(db))
+        finally:
+            db.close()
+    print(f"notes_count fixed for {fixed} contacts")
+
+
+if __name__ == '__main__':
+    main()
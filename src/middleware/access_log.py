@@ -0,0 +1,169 @@
+import json
+import logging
+import queue
+import random
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger("access")
+
+# counters of the current request, filled by database and cache code through record
+request_stats: ContextVar[dict | None] = ContextVar("request_stats", default=None)
+
+
+def record(name: str, amount: float = 1) -> None:
+    """
+        add amount to a counter of the current request, does nothing outside of a request
+
+        :param name: counter, e.g. db_ms or cache_hits
+        :type name: str
+        :param amount: value to add
+        :type amount: float
+        :return: None
+        :rtype: None
+        """
+    stats = request_stats.get()
+    if stats is not None:
+        stats[name] = stats.get(name, 0) + amount
+
+
+def record_user(user_id: int) -> None:
+    """
+        remember the authenticated user of the current request for its access log record.
+        The stats dict is shared with tasks the request runs in, unlike a ContextVar set inside them.
+
+        :param user_id: user id
+        :type user_id: int
+        :return: None
+        :rtype: None
+        """
+    stats = request_stats.get()
+    if stats is not None:
+        stats["user_id"] = user_id
+
+
+class JsonFormatter(logging.Formatter):
+    """
+        one JSON object per record, with the fields of the access extra merged in
+        """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {"time": self.formatTime(record), "level": record.levelname, "logger": record.name,
+                 "message": record.getMessage()}
+        entry.update(getattr(record, "access", {}))
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RootQueueListener(QueueListener):
+    """
+        listener of the queue the root logger writes to, stop restores the root handlers it replaced
+        """
+
+    def __init__(self, log_queue: queue.SimpleQueue, handler: logging.Handler):
+        super().__init__(log_queue, handler, respect_handler_level=True)
+        self.replaced = []
+
+    def stop(self) -> None:
+        super().stop()
+        logging.getLogger().handlers = self.replaced
+
+
+def configure_logging(level: str | int = logging.INFO, handler: logging.Handler | None = None) -> QueueListener:
+    """
+        send all records through a queue to handler written from a listener thread,
+        so logging calls on the event loop never wait for I/O
+
+        :param level: root level
+        :type level: str | int
+        :param handler: handler doing the I/O, JSON lines on stderr by default
+        :type handler: logging.Handler | None
+        :return: started listener, stop it on shutdown to flush the queue
+        :rtype: QueueListener
+        """
+    if handler is None:
+        handler = logging.StreamHandler()
+        handler.setFormatter(JsonFormatter())
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    listener = RootQueueListener(log_queue, handler)
+    listener.replaced, root.handlers = root.handlers, [QueueHandler(log_queue)]
+    root.setLevel(level)
+    listener.start()
+    return listener
+
+
+def route_template(scope: Scope) -> str:
+    """
+        path template of the matched route, e.g. /api/contacts/{contact_id}
+
+        :param scope: request scope after routing
+        :type scope: Scope
+        :return: route path, the request path when no route matched
+        :rtype: str
+        """
+    route = scope.get("route")
+    return getattr(route, "path_format", None) or scope["path"]
+
+
+class AccessLogMiddleware:
+    """
+        one structured record per request on the access logger: method, route, status, duration,
+        database time and queries, cache hits and misses and user id.
+        Routes matching a prefix of sample_rates are logged with that probability,
+        errors and requests slower than slow_ms always.
+
+        :param app: application
+        :type app: ASGIApp
+        :param sample_rates: share of requests logged by path prefix, 1 for routes not listed
+        :type sample_rates: Dict[str, float]
+        :param slow_ms: duration above which a request is always logged
+        :type slow_ms: float
+        """
+
+    def __init__(self, app: ASGIApp, sample_rates: Dict[str, float] | None = None, slow_ms: float = 1000):
+        self.app = app
+        self.sample_rates = sample_rates or {}
+        self.slow_ms = slow_ms
+
+    def sample_rate(self, path: str) -> float:
+        """
+            :return: share of requests for path that are logged
+            :rtype: float
+            """
+        prefixes = [prefix for prefix in self.sample_rates if path.startswith(prefix)]
+        return self.sample_rates[max(prefixes, key=len)] if prefixes else 1.0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = {}
+        token = request_stats.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_stats.reset(token)
+            duration_ms = (time.perf_counter() - started) * 1000
+            if (status_code >= 500 or duration_ms >= self.slow_ms
+                    or random.random() < self.sample_rate(scope["path"])):
+                route = route_template(scope)
+                access = {"method": scope["method"], "route": route, "path": scope["path"], "status": status_code,
+                          "duration_ms": round(duration_ms, 3), "db_ms": round(stats.get("db_ms", 0), 3),
+                          "db_queries": stats.get("db_queries", 0), "cache_hits": stats.get("cache_hits", 0),
+                          "cache_misses": stats.get("cache_misses", 0), "user_id": stats.get("user_id")}
+                logger.info("%s %s %s", scope["method"], route, status_code, extra={"access": access})
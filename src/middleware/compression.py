@@ -0,0 +1,232 @@
+import zlib
+from typing import Dict, List
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# levels by content type prefix, content types not listed here are sent as is
+DEFAULT_LEVELS = {
+    "application/json": {"br": 5, "zstd": 6, "gzip": 6},
+    "text/": {"br": 5, "zstd": 6, "gzip": 6},
+    "application/javascript": {"br": 6, "zstd": 8, "gzip": 6},
+    "image/svg+xml": {"br": 6, "zstd": 8, "gzip": 6},
+}
+
+
+class Encoder:
+    """
+        incremental compressor for one response
+
+        :param encoding: br, zstd or gzip
+        :type encoding: str
+        :param level: compression level of the encoding
+        :type level: int
+        """
+
+    def __init__(self, encoding: str, level: int):
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=level)
+            self._compress, self._flush, self._finish = compressor.process, compressor.flush, compressor.finish
+        elif encoding == "zstd":
+            compressor = zstandard.ZstdCompressor(level=level).compressobj()
+            self._compress, self._finish = compressor.compress, compressor.flush
+            self._flush = lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        else:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+            self._compress, self._finish = compressor.compress, compressor.flush
+            self._flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def encode(self, data: bytes, final: bool) -> bytes:
+        """
+            compress a chunk, flushed so the client can decode it without waiting for the next one
+
+            :param data: chunk of the body
+            :type data: bytes
+            :param final: last chunk of the body
+            :type final: bool
+            :return: compressed bytes
+            :rtype: bytes
+            """
+        return self._compress(data) + (self._finish() if final else self._flush())
+
+
+def available_encodings() -> List[str]:
+    """
+        :return: supported encodings in order of preference
+        :rtype: List[str]
+        """
+    return [encoding for encoding, module in (("br", brotli), ("zstd", zstandard), ("gzip", zlib)) if module]
+
+
+def negotiate(accept_encoding: str, encodings: List[str]) -> str | None:
+    """
+        pick the encoding with the highest q value, ties go to the server preference
+
+        :param accept_encoding: Accept-Encoding header
+        :type accept_encoding: str
+        :param encodings: supported encodings in order of preference
+        :type encodings: List[str]
+        :return: encoding or None for identity
+        :rtype: str | None
+        """
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                continue
+        weights[name.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CompressionMiddleware:
+    """
+        compress responses with the best encoding the client accepts.
+        Complete bodies under minimum_size, content types without levels and byte ranges are sent as is;
+        streamed bodies are compressed chunk by chunk.
+
+        :param app: application
+        :type app: ASGIApp
+        :param minimum_size: smallest body in bytes worth compressing
+        :type minimum_size: int
+        :param levels: levels by encoding for content type prefixes
+        :type levels: Dict[str, Dict[str, int]]
+        """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 500, levels: Dict[str, Dict[str, int]] | None = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = DEFAULT_LEVELS if levels is None else levels
+        self.encodings = available_encodings()
+        self.responses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @property
+    def stats(self) -> dict:
+        """
+            counters since start
+
+            :return: compressed responses, bytes before and after compression and bytes saved
+            :rtype: dict
+            """
+        return {"responses": self.responses, "bytes_in": self.bytes_in, "bytes_out": self.bytes_out,
+                "bytes_saved": self.bytes_in - self.bytes_out}
+
+    def level(self, content_type: str, encoding: str) -> int | None:
+        """
+            level for the longest content type prefix that matches
+
+            :param content_type: Content-Type header of the response
+            :type content_type: str
+            :param encoding: negotiated encoding
+            :type encoding: str
+            :return: level, None if the content type shouldn't be compressed
+            :rtype: int | None
+            """
+        media_type = content_type.split(";")[0].strip().lower()
+        prefixes = [prefix for prefix in self.levels if media_type.startswith(prefix)]
+        return self.levels[max(prefixes, key=len)].get(encoding) if prefixes else None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _Responder(self, encoding, send).send)
+
+
+class _Responder:
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self.start: Message | None = None
+        self.encoder: Encoder | None = None
+        self.passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if self.passthrough:
+            await self._send(message)
+        elif message["type"] == "http.response.start":
+            self.start = message
+        elif message["type"] == "http.response.body" and self.encoder is None:
+            await self._first_body(message)
+        elif message["type"] == "http.response.body":
+            await self._send_compressed(message)
+        else:
+            await self._send(message)
+
+    async def _first_body(self, message: Message) -> None:
+        headers = MutableHeaders(raw=self.start["headers"])
+        body, more_body = message.get("body", b""), message.get("more_body", False)
+        level = self.middleware.level(headers.get("content-type", ""), self.encoding)
+        if level is not None:
+            headers.add_vary_header("Accept-Encoding")
+        too_small = not more_body and len(body) < self.middleware.minimum_size
+        if level is None or "content-encoding" in headers or "content-range" in headers or too_small:
+            self.passthrough = True
+            await self._send(self.start)
+            await self._send(message)
+            return
+        self.encoder = Encoder(self.encoding, level)
+        headers["Content-Encoding"] = self.encoding
+        self.middleware.responses += 1
+        if more_body:
+            del headers["Content-Length"]
+            await self._send(self.start)
+            await self._send_compressed(message)
+            return
+        compressed = self.encoder.encode(body, final=True)
+        headers["Content-Length"] = str(len(compressed))
+        await self._send(self.start)
+        await self._send_compressed(message, compressed)
+
+    async def _send_compressed(self, message: Message, compressed: bytes | None = None) -> None:
+        body, more_body = message.get("body", b""), message.get("more_body", False)
+        if compressed is None:
+            compressed = self.encoder.encode(body, final=not more_body)
+        self.middleware.bytes_in += len(body)
+        self.middleware.bytes_out += len(compressed)
+        await self._send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+
+
+def parse_levels(value: str) -> Dict[str, Dict[str, int]]:
+    """
+        parse levels setting
+
+        :param value: content_type:encoding=level pairs separated by commas, e.g. application/json:gzip=4
+        :type value: str
+        :return: levels by encoding for content type prefixes
+        :rtype: Dict[str, Dict[str, int]]
+        """
+    levels = {prefix: dict(encodings) for prefix, encodings in DEFAULT_LEVELS.items()}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        content_type, _, setting = item.strip().rpartition(":")
+        encoding, _, level = setting.partition("=")
+        levels.setdefault(content_type, {})[encoding] = int(level)
+    return levels
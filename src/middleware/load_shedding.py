@@ -0,0 +1,176 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# monotonic time the current request has to be answered by
+deadline: ContextVar[float | None] = ContextVar("deadline", default=None)
+
+
+def remaining() -> float | None:
+    """
+        :return: seconds left until the deadline of the current request, None without a deadline
+        :rtype: float | None
+        """
+    expires = deadline.get()
+    return None if expires is None else max(expires - time.monotonic(), 0.0)
+
+
+def parse_prefix_values(value: str) -> Dict[str, float]:
+    """
+        parse a setting of numbers by path prefix, such as route timeouts or log sample rates
+
+        :param value: path_prefix=number pairs separated by commas, e.g. /api/contacts/find=2,/api/auth=5
+        :type value: str
+        :return: numbers by path prefix
+        :rtype: Dict[str, float]
+        """
+    values = {}
+    for item in value.split(","):
+        if item.strip():
+            prefix, _, number = item.strip().partition("=")
+            values[prefix] = float(number)
+    return values
+
+
+class LoadSheddingMiddleware:
+    """
+        bound the requests the app works on at once and the time each of them may take.
+        At most max_in_flight requests run, up to max_queue more wait for a slot
+        and the rest are refused at once with 503 and Retry-After.
+        Every request gets a deadline, the longest matching prefix of route_timeouts or timeout;
+        waiting for a slot counts against it, work past it is cancelled and answered with 504.
+        The deadline is kept in a context variable so database sessions can bound their statements.
+
+        :param app: application
+        :type app: ASGIApp
+        :param max_in_flight: requests served at once, 0 for no limit
+        :type max_in_flight: int
+        :param max_queue: requests waiting for a slot
+        :type max_queue: int
+        :param timeout: seconds a request may take, 0 for no deadline
+        :type timeout: float
+        :param route_timeouts: seconds by path prefix
+        :type route_timeouts: Dict[str, float]
+        :param retry_after: Retry-After of refused requests in seconds
+        :type retry_after: int
+        :param exempt: path prefixes served without limits, e.g. probes
+        :type exempt: Tuple[str, ...]
+        """
+
+    def __init__(self, app: ASGIApp, max_in_flight: int = 100, max_queue: int = 200, timeout: float = 30,
+                 route_timeouts: Dict[str, float] | None = None, retry_after: int = 1,
+                 exempt: Tuple[str, ...] = ("/livez", "/readyz")):
+        self.app = app
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.route_timeouts = route_timeouts or {}
+        self.retry_after = retry_after
+        self.exempt = exempt
+        self._waiters = deque()
+        self.in_flight = 0
+        self.waiting = 0
+        self.shed = 0
+        self.timed_out = 0
+
+    @property
+    def stats(self) -> dict:
+        """
+            :return: requests in flight and waiting now, refused and timed out since start
+            :rtype: dict
+            """
+        return {"in_flight": self.in_flight, "waiting": self.waiting, "shed": self.shed, "timed_out": self.timed_out}
+
+    def budget(self, path: str) -> float:
+        """
+            :return: seconds the request for path may take, 0 for no deadline
+            :rtype: float
+            """
+        prefixes = [prefix for prefix in self.route_timeouts if path.startswith(prefix)]
+        return self.route_timeouts[max(prefixes, key=len)] if prefixes else self.timeout
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith(self.exempt):
+            await self.app(scope, receive, send)
+            return
+        budget = self.budget(scope["path"])
+        started = time.monotonic()
+        token = deadline.set(started + budget if budget else None)
+        try:
+            if self.max_in_flight and self.in_flight >= self.max_in_flight and self.waiting >= self.max_queue:
+                self.shed += 1
+                await self._reject(send, 503, "Server is overloaded", {"retry-after": str(self.retry_after)})
+                return
+            try:
+                await self._acquire(budget or None)
+            except asyncio.TimeoutError:
+                self.shed += 1
+                await self._reject(send, 503, "Server is overloaded", {"retry-after": str(self.retry_after)})
+                return
+            left = max(budget - (time.monotonic() - started), 0.001) if budget else 0
+            try:
+                await self._serve(scope, receive, send, left)
+            finally:
+                self._release()
+        finally:
+            deadline.reset(token)
+
+    async def _acquire(self, timeout: float | None) -> None:
+        if not self.max_in_flight or self.in_flight < self.max_in_flight:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except BaseException:
+            # the slot may have been handed over just before the wait was cancelled
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+        finally:
+            self.waiting -= 1
+
+    def _release(self) -> None:
+        # hand the slot over to the oldest waiting request, in_flight stays the same
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    async def _serve(self, scope: Scope, receive: Receive, send: Send, budget: float) -> None:
+        started = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal started
+            started = started or message["type"] == "http.response.start"
+            await send(message)
+
+        try:
+            await asyncio.wait_for(self.app(scope, receive, send_wrapper), budget or None)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            logger.warning("%s %s cancelled after its %ss deadline", scope["method"], scope["path"],
+                           self.budget(scope["path"]))
+            if started:
+                raise
+            await self._reject(send, 504, "Request deadline exceeded")
+
+    @staticmethod
+    async def _reject(send: Send, status_code: int, detail: str, headers: Dict[str, str] | None = None) -> None:
+        body = json.dumps({"detail": detail}).encode()
+        raw_headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        raw_headers += [(name.encode(), value.encode()) for name, value in (headers or {}).items()]
+        await send({"type": "http.response.start", "status": status_code, "headers": raw_headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,261 @@
+import functools
+import inspect
+import logging
+from contextlib import contextmanager
+from typing import Callable, Iterator, List
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.middleware.access_log import route_template
+
+# opentelemetry is imported by configure_tracing, until then spans are skipped at the cost of one check
+_tracer = None
+_redis_instrumented = False
+otel_context = propagate = trace = Link = SpanKind = StatusCode = None
+
+
+class _NoopSpan:
+
+    def set_attribute(self, key, value) -> None:
+        pass
+
+    def record_exception(self, exception) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+@contextmanager
+def span(name: str, kind=None, links: List | None = None, **attributes) -> Iterator:
+    """
+        child span of the current one for the duration of the block, exceptions are recorded on it
+
+        :param name: span name
+        :type name: str
+        :param kind: SpanKind, INTERNAL by default
+        :param links: links to spans of other traces
+        :type links: List[Link] | None
+        :param attributes: span attributes
+        :return: span, a no-op one when tracing is off
+        """
+    if _tracer is None:
+        yield NOOP_SPAN
+        return
+    with _tracer.start_as_current_span(name, kind=kind or SpanKind.INTERNAL, links=links,
+                                       attributes=attributes) as current:
+        yield current
+
+
+def start_span(name: str, kind=None, **attributes):
+    """
+        child span of the current one that is not made current, end it with span.end()
+
+        :param name: span name
+        :type name: str
+        :param kind: SpanKind, INTERNAL by default
+        :param attributes: span attributes
+        :return: span, a no-op one when tracing is off
+        """
+    if _tracer is None:
+        return NOOP_SPAN
+    return _tracer.start_span(name, kind=kind or SpanKind.INTERNAL, attributes=attributes)
+
+
+def fail(current, err: BaseException) -> None:
+    """
+        mark span as failed by err
+
+        :param current: span
+        :param err: exception
+        :type err: BaseException
+        :return: None
+        :rtype: None
+        """
+    if current is not NOOP_SPAN:
+        current.record_exception(err)
+        current.set_status(StatusCode.ERROR, str(err))
+
+
+def current_link():
+    """
+        link to the current span, for work that serves several requests at once
+
+        :return: Link or None when tracing is off or there is no current span
+        :rtype: Link | None
+        """
+    if _tracer is None:
+        return None
+    span_context = trace.get_current_span().get_span_context()
+    return Link(span_context) if span_context.is_valid else None
+
+
+def traced(func: Callable) -> Callable:
+    """
+        wrap func to run in a span under the trace context current now, e.g. for a background task
+        that runs after the request span ended
+
+        :param func: sync or async function
+        :type func: Callable
+        :return: wrapped function
+        :rtype: Callable
+        """
+    if _tracer is None:
+        return func
+    parent = otel_context.get_current()
+    name = f"background {func.__name__}"
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            token = otel_context.attach(parent)
+            try:
+                with span(name):
+                    return await func(*args, **kwargs)
+            finally:
+                otel_context.detach(token)
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            token = otel_context.attach(parent)
+            try:
+                with span(name):
+                    return func(*args, **kwargs)
+            finally:
+                otel_context.detach(token)
+    return wrapper
+
+
+def instrument_redis() -> None:
+    """
+        span for every redis command and pipeline of every client, done once per process
+
+        :return: None
+        :rtype: None
+        """
+    global _redis_instrumented
+    if _redis_instrumented:
+        return
+    from redis.asyncio.client import Pipeline, Redis
+
+    execute_command, execute = Redis.execute_command, Pipeline.execute
+
+    @functools.wraps(execute_command)
+    async def traced_execute_command(self, *args, **options):
+        with span(f"redis {args[0]}", kind=SpanKind.CLIENT, **{"db.system": "redis"}):
+            return await execute_command(self, *args, **options)
+
+    @functools.wraps(execute)
+    async def traced_execute(self, *args, **kwargs):
+        with span("redis pipeline", kind=SpanKind.CLIENT,
+                  **{"db.system": "redis", "db.redis.commands": len(self.command_stack)}):
+            return await execute(self, *args, **kwargs)
+
+    Redis.execute_command, Pipeline.execute = traced_execute_command, traced_execute
+    _redis_instrumented = True
+
+
+def configure_tracing(exporter, service_name: str = "hw-fourteen", batch: bool = True) -> None:
+    """
+        record spans and send them to exporter, needs opentelemetry-sdk,
+        and opentelemetry-exporter-otlp-proto-http for otlp
+
+        :param exporter: SpanExporter, or console or otlp
+        :type exporter: SpanExporter | str
+        :param service_name: service.name resource attribute
+        :type service_name: str
+        :param batch: export from a background thread in batches, off for tests reading spans at once
+        :type batch: bool
+        :return: None
+        :rtype: None
+        """
+    global _tracer, otel_context, propagate, trace, Link, SpanKind, StatusCode
+    try:
+        from opentelemetry import context as otel_context, propagate, trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SimpleSpanProcessor
+        from opentelemetry.trace import Link, SpanKind, StatusCode
+    except ImportError:
+        logging.warning("tracing needs opentelemetry-sdk, spans are not recorded")
+        return
+    if exporter == "console":
+        exporter = ConsoleSpanExporter()
+    elif exporter == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            logging.warning("otlp tracing needs opentelemetry-exporter-otlp-proto-http, spans are not recorded")
+            return
+        exporter = OTLPSpanExporter()
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(exporter) if batch else SimpleSpanProcessor(exporter))
+    _tracer = provider.get_tracer(__name__)
+    instrument_redis()
+
+
+def in_memory_tracing():
+    """
+        record spans in memory, for tests
+
+        :return: exporter holding finished spans
+        :rtype: InMemorySpanExporter
+        """
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    exporter = InMemorySpanExporter()
+    configure_tracing(exporter, batch=False)
+    return exporter
+
+
+def disable_tracing() -> None:
+    """
+        stop recording spans
+
+        :return: None
+        :rtype: None
+        """
+    global _tracer
+    _tracer = None
+
+
+class TracingMiddleware:
+    """
+        server span for every request, continuing the trace of the caller from traceparent headers.
+        The span is named by method and route template once the route is known.
+
+        :param app: application
+        :type app: ASGIApp
+        """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or _tracer is None:
+            await self.app(scope, receive, send)
+            return
+        token = otel_context.attach(propagate.extract(dict(Headers(scope=scope))))
+        try:
+            with span(f"{scope['method']} {scope['path']}", kind=SpanKind.SERVER,
+                      **{"http.method": scope["method"], "http.target": scope["path"]}) as current:
+
+                async def send_wrapper(message: Message) -> None:
+                    if message["type"] == "http.response.start":
+                        current.set_attribute("http.status_code", message["status"])
+                        if message["status"] >= 500:
+                            current.set_status(StatusCode.ERROR)
+                    await send(message)
+
+                try:
+                    await self.app(scope, receive, send_wrapper)
+                finally:
+                    route = route_template(scope)
+                    current.set_attribute("http.route", route)
+                    current.update_name(f"{scope['method']} {route}")
+        finally:
+            otel_context.detach(token)
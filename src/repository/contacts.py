@@ -1,11 +1,15 @@
-from datetime import date, datetime
-from typing import List
+import calendar
+from datetime import date, timedelta
+from typing import List, Tuple
 
-from sqlalchemy import and_
+from sqlalchemy import and_, exists, extract, func, or_, select, update as sql_update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
 
 from src.schemas import ContactModel
-from src.database.models import Contact, User
+from src.database.models import Contact, Note, User
+
+SORT_FIELDS = ("id", "first_name", "last_name", "notes_count")
 
 
 async def create(body: ContactModel, user: User, db: AsyncSession) -> Contact:
@@ -28,7 +32,8 @@ async def create(body: ContactModel, user: User, db: AsyncSession) -> Contact:
     return new_contact
 
 
-async def get_all(skip: int, limit: int, user: User, db: AsyncSession) -> List[Contact]:
+async def get_all(skip: int, limit: int, user: User, db: AsyncSession, sort_by: str = "id",
+                  fields: Tuple[str, ...] | None = None) -> List[Contact]:
     """
         get part of contact from current user
 
@@ -40,10 +45,19 @@ async def get_all(skip: int, limit: int, user: User, db: AsyncSession) -> List[C
         :type user: User
         :param db: current async session to db
         :type db: AsyncSession
+        :param sort_by: one of SORT_FIELDS, "-" prefix for descending order
+        :type sort_by: str
+        :param fields: columns to load, all if None
+        :type fields: Tuple[str, ...] | None
         :return: part of contact from current user
         :rtype: List
         """
-    contacts = db.query(Contact).filter(Contact.user_id == user.id).offset(skip).limit(limit).all()
+    column = getattr(Contact, sort_by.lstrip("-"))
+    order = [column.desc() if sort_by.startswith("-") else column.asc(), Contact.id]
+    query = db.query(Contact)
+    if fields:
+        query = query.options(load_only(*(getattr(Contact, name) for name in fields)))
+    contacts = query.filter(Contact.user_id == user.id).order_by(*order).offset(skip).limit(limit).all()
     return contacts
 
 
@@ -64,6 +78,35 @@ async def get_one(contact_id, user: User, db: AsyncSession):
     return contact
 
 
+async def get_one_with_notes(contact_id, notes_limit: int, user: User, db: AsyncSession):
+    """
+        get contact by db id with its latest notes in one query
+
+        :param contact_id: id to find
+        :type contact_id: int
+        :param notes_limit: max number of notes, newest first
+        :type notes_limit: int
+        :param user: current user - contact owner
+        :type user: User
+        :param db: current async session to db
+        :type db: AsyncSession
+        :return: Contact and its notes, (None, []) if contact not found
+        :rtype: Tuple[Contact | None, List[Note]]
+        """
+    latest = (select(Note.id)
+              .where(and_(Note.user_id == user.id, Note.contact_id == contact_id))
+              .order_by(Note.id.desc())
+              .limit(notes_limit))
+    rows = (db.query(Contact, Note)
+            .outerjoin(Note, and_(Note.contact_id == Contact.id, Note.id.in_(latest)))
+            .filter(and_(Contact.user_id == user.id, Contact.id == contact_id))
+            .order_by(Note.id.desc())
+            .all())
+    if not rows:
+        return None, []
+    return rows[0][0], [note for _, note in rows if note is not None]
+
+
 async def update(contact_id, body: ContactModel, user: User, db: AsyncSession):
     """
         Update contact field, find by db id
@@ -160,6 +203,28 @@ async def find_by_email(email, user: User, db: AsyncSession):
     return contact
 
 
+def birthday_within(today: date, days: int):
+    """
+        condition for contacts with birthday from today to today + days,
+        in common years Feb 29 birthdays fall on Feb 28
+
+        :param today: first day
+        :type today: date
+        :param days: number of days after today
+        :type days: int
+        :return: filter condition
+        :rtype: ColumnElement
+        """
+    month, day = extract("month", Contact.birthday), extract("day", Contact.birthday)
+    conditions = []
+    for shift in range(days + 1):
+        current = today + timedelta(days=shift)
+        conditions.append(and_(month == current.month, day == current.day))
+        if (current.month, current.day) == (2, 28) and not calendar.isleap(current.year):
+            conditions.append(and_(month == 2, day == 29))
+    return or_(*conditions)
+
+
 async def find_birthday7day(user: User, db: AsyncSession):
     """
         contact with birthday next 7 days
@@ -171,15 +236,49 @@ async def find_birthday7day(user: User, db: AsyncSession):
         :return: contact with birthday next 7 days
         :rtype: List
         """
+    condition = and_(Contact.user_id == user.id, birthday_within(date.today(), 7))
+    contacts = db.query(Contact).filter(condition).order_by(Contact.id).all()
+    return contacts
+
+
+async def upcoming_birthdays(today: date, days: int, db: AsyncSession) -> List[Contact]:
+    """
+        contacts of all users with birthday in days from today in one query
 
-    contacts = []
-    db_contacts = await get_all(user, db)
-    today = date.today()
-    for db_contact in db_contacts:
-        birthday = db_contact.birthday
-        shift = (datetime(today.year, birthday.month, birthday.day).date() - today).days
-        if shift < 0:
-            shift = (datetime(today.year + 1, birthday.month, birthday.day).date() - today).days
-        if shift <= 7:
-            contacts.append(db_contact)
+        :param today: first day
+        :type today: date
+        :param days: number of days after today
+        :type days: int
+        :param db: current async session to db
+        :type db: AsyncSession
+        :return: contacts ordered by owner
+        :rtype: List[Contact]
+        """
+    contacts = db.query(Contact).filter(birthday_within(today, days)).order_by(Contact.user_id, Contact.id).all()
     return contacts
+
+
+async def recount_notes(db: AsyncSession) -> int:
+    """
+        repair notes_count of all contacts from one GROUP BY pass over notes
+
+        :param db: current async session to db
+        :type db: AsyncSession
+        :return: number of fixed contacts
+        :rtype: int
+        """
+    counts = select(Note.contact_id, func.count(Note.id).label("notes_count")).group_by(Note.contact_id).subquery()
+    fixed = db.execute(
+        sql_update(Contact)
+        .where(and_(Contact.id == counts.c.contact_id, Contact.notes_count != counts.c.notes_count))
+        .values(notes_count=counts.c.notes_count)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    fixed += db.execute(
+        sql_update(Contact)
+        .where(and_(Contact.notes_count != 0, ~exists().where(Note.contact_id == Contact.id)))
+        .values(notes_count=0)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return fixed
@@ -1,13 +1,17 @@
+from datetime import datetime
+from typing import Tuple
+
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import and_
+from sqlalchemy.orm import joinedload, load_only
+from sqlalchemy import and_, literal, select, text, update as sql_update
 
-from src.database.models import Note, User
+from src.database.models import Contact, Note, User
 from src.schemas import NoteModel
 
 
-async def create(body: NoteModel, db: AsyncSession):
+async def create(body: NoteModel, user: User, db: AsyncSession):
     """
-        Creates a new note for a specific user.
+        Creates a new note for a specific user and increments notes_count of its contact in the same transaction.
 
            :param body: all parameters for new note
            :type body: NoteModel
@@ -18,25 +22,50 @@ async def create(body: NoteModel, db: AsyncSession):
            :return: Note | None
            :rtype: Note | None
         """
-    note = Note(**body.model_dump())
+    note = Note(**body.model_dump(), user_id=user.id)
     db.add(note)
+    db.execute(sql_update(Contact).where(and_(Contact.id == note.contact_id, Contact.user_id == user.id))
+               .values(notes_count=Contact.notes_count + 1))
     db.commit()
     db.refresh(note)
     return note
 
 
-async def get_all(user: User, db: AsyncSession):
+async def get_all(user: User, db: AsyncSession, contact_id: int | None = None, created_after: datetime | None = None,
+                  after_id: int | None = None, limit: int = 50, fields: Tuple[str, ...] | None = None):
     """
-       get notes from current user
+       get page of notes from current user in id order
 
        :param user: current user - contact owner
        :type user: User
        :param db: current async session to db
        :type db: AsyncSession
+       :param contact_id: only notes of this contact
+       :type contact_id: int | None
+       :param created_after: only notes created after this moment
+       :type created_after: datetime | None
+       :param after_id: keyset cursor, id of the last note of the previous page
+       :type after_id: int | None
+       :param limit: page size
+       :type limit: int
+       :param fields: columns to load, "contact" loads the contact in the same query, all if None
+       :type fields: Tuple[str, ...] | None
        :return: Note
        :rtype: List
        """
-    notes = db.query(Note).filter(Note.user_id == user.id).all()
+    query = db.query(Note)
+    if fields:
+        query = query.options(load_only(*(getattr(Note, name) for name in fields if name != "contact")))
+        if "contact" in fields:
+            query = query.options(joinedload(Note.contact))
+    query = query.filter(Note.user_id == user.id)
+    if contact_id is not None:
+        query = query.filter(Note.contact_id == contact_id)
+    if created_after is not None:
+        query = query.filter(Note.created_at > created_after)
+    if after_id is not None:
+        query = query.filter(Note.id > after_id)
+    notes = query.order_by(Note.id).limit(limit).all()
     return notes
 
 
@@ -53,7 +82,7 @@ async def get_one(note_id, user: User, db: AsyncSession):
        :return: Note | None
        :rtype: Note | None
        """
-    note = await db.query(Note).filter(and_(Note.user_id == user.id, Note.id == note_id)).first()
+    note = db.query(Note).filter(and_(Note.user_id == user.id, Note.id == note_id)).first()
     return note
 
 
@@ -81,7 +110,7 @@ async def update(note_id, body: NoteModel, user: User, db: AsyncSession):
 
 async def delete(note_id, user: User, db: AsyncSession):
     """
-        delete note find note by db id
+        delete note find note by db id and decrement notes_count of its contact in the same transaction
 
         :param note_id: id to find
         :type note_id: int
@@ -95,5 +124,58 @@ async def delete(note_id, user: User, db: AsyncSession):
     note = await get_one(note_id, user, db)
     if note:
         db.delete(note)
+        db.execute(sql_update(Contact).where(and_(Contact.id == note.contact_id, Contact.user_id == user.id))
+                   .values(notes_count=Contact.notes_count - 1))
         db.commit()
     return note
+
+
+SEARCH_SQL = {
+    "postgresql": text(
+        "SELECT notes.id, notes.contact_id, notes.text, ts_rank(notes.text_search, query) AS rank, "
+        "ts_headline('simple', notes.text, query, 'StartSel=<b>, StopSel=</b>, MaxFragments=2') AS snippet "
+        "FROM notes, websearch_to_tsquery('simple', :query) AS query "
+        "WHERE notes.user_id = :user_id AND notes.text_search @@ query "
+        "ORDER BY rank DESC, notes.id LIMIT :limit OFFSET :skip"
+    ),
+    "sqlite": text(
+        "SELECT notes.id, notes.contact_id, notes.text, -bm25(notes_fts) AS rank, "
+        "snippet(notes_fts, 0, '<b>', '</b>', '...', 16) AS snippet "
+        "FROM notes_fts JOIN notes ON notes.id = notes_fts.rowid "
+        "WHERE notes_fts MATCH :query AND notes.user_id = :user_id "
+        "ORDER BY rank DESC, notes.id LIMIT :limit OFFSET :skip"
+    ),
+}
+
+
+async def search(query: str, skip: int, limit: int, user: User, db: AsyncSession):
+    """
+        full-text search in notes of current user, best matches first
+
+        :param query: words to search
+        :type query: str
+        :param skip: number of hits to skip
+        :type skip: int
+        :param limit: number of hits to return
+        :type limit: int
+        :param user: current user - note owner
+        :type user: User
+        :param db: current async session to db
+        :type db: AsyncSession
+        :return: hits with rank and highlighted snippet
+        :rtype: List
+        """
+    dialect = db.get_bind().dialect.name
+    if dialect not in SEARCH_SQL:
+        # no full-text index on other databases: notes containing every word, unranked
+        words = [word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") for word in query.split()]
+        rows = db.execute(
+            select(Note.id, Note.contact_id, Note.text, literal(0).label("rank"), Note.text.label("snippet"))
+            .where(Note.user_id == user.id, *(Note.text.ilike(f"%{word}%", escape="\\") for word in words))
+            .order_by(Note.id).limit(limit).offset(skip))
+        return [row._asdict() for row in rows]
+    if dialect == "sqlite":
+        # every word as a quoted FTS5 string, so user input can't inject query syntax
+        query = " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+    rows = db.execute(SEARCH_SQL[dialect], {"query": query, "user_id": user.id, "limit": limit, "skip": skip})
+    return [row._asdict() for row in rows]
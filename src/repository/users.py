@@ -1,3 +1,5 @@
+from typing import List
+
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.schemas import UserModel
@@ -18,6 +20,20 @@ async def get_user_by_email(email: str, db: AsyncSession) -> User:
     return db.query(User).filter(User.email == email).first()
 
 
+async def get_users_by_ids(user_ids: List[int], db: AsyncSession) -> List[User]:
+    """
+        Get users by ids in one query
+
+        :param user_ids: ids of users
+        :type user_ids: List[int]
+        :param db: current async session to db
+        :type db: AsyncSession
+        :return: found users
+        :rtype: List[User]
+        """
+    return db.query(User).filter(User.id.in_(user_ids)).all()
+
+
 async def create_user(body: UserModel, db: AsyncSession) -> User:
     """
         Create a new user
@@ -87,3 +103,19 @@ async def update_avatar(email: str, url: str, db: AsyncSession) -> User:
     await db.commit()
     return user
 
+
+async def update_password(user: User, password_hash: str, db: AsyncSession) -> None:
+    """
+        Replace user's password hash, used to rehash on login when hash policy changes
+
+        :param user: user to update
+        :type user: User
+        :param password_hash: new hash of the same password
+        :type password_hash: str
+        :param db: current async session to db
+        :type db: AsyncSession
+        :return: None
+        :rtype: None
+        """
+    user.password = password_hash
+    db.commit()
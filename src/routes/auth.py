@@ -3,9 +3,12 @@ from fastapi.security import HTTPBearer, OAuth2PasswordRequestForm, HTTPAuthoriz
 from fastapi.responses import RedirectResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.database.models import User
 from src.repository import users as repository_user
 from src.schemas import UserResponse, UserModel, TokenModel, RequestEmail
-from src.database.connector import get_db
+from src.database.connector import get_db, get_read_db
+from src.conf.config import settings
+from src.middleware.tracing import traced
 from src.services.auth import auth_service
 from src.services.email import send_email
 
@@ -37,14 +40,14 @@ async def signup(body: UserModel, background_task: BackgroundTasks, request: Req
     body.password = auth_service.get_hash(body.password)
 
     new_user = await repository_user.create_user(body, db)
-    background_task.add_task(send_email, body.email, new_user.name, str(request.base_url))
+    background_task.add_task(traced(send_email), body.email, new_user.name, str(request.base_url))
     return {"user": new_user, "detail": "User successfully created"}
 
 
 @router.post("/login", response_model=TokenModel)
 async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """
-        router to login user and create/refresh token
+        router to login user and create/refresh token, the password is rehashed if hash policy changed
 
         :param body: password form data
         :type body: OAuth2PasswordRequestForm
@@ -56,42 +59,66 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession =
     user = await repository_user.get_user_by_email(body.username, db)
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email")
-    if not auth_service.verify_password(body.password, user.password):
+    valid, new_hash = auth_service.verify_and_update(body.password, user.password)
+    if not valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
+    if new_hash:
+        await repository_user.update_password(user, new_hash, db)
 
-    access_token = await auth_service.create_access_token(data={"sub": user.email})
+    access_token = await auth_service.create_access_token(data=await auth_service.access_claims(user))
     refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
-
-    await repository_user.update_token(user, refresh_token, db)
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
 @router.get("/refresh_token", response_model=TokenModel)
 async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security),
-                        db: AsyncSession = Depends(get_db)):
+                        db: AsyncSession = Depends(get_read_db)):
     """
-        router to refresh token
+        router to refresh token, the old refresh token is used up and a new one of the same family is issued
 
         :param credentials: data with old token
         :type credentials: HTTPAuthorizationCredentials
-        :param db: current async session to db
+        :param db: current async session to db, used only to fill claims in stateless mode
         :type db: AsyncSession
         :return: token JWT
         :rtype: dict
         """
     token = credentials.credentials
-    email = await auth_service.decode_refresh_token(token)
-    user = await repository_user.get_user_by_email(email, db)
+    email, family = await auth_service.use_refresh_token(token)
 
-    if user.refresh_token is not token:
-        await repository_user.update_token(user, None, db)
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+    claims = {"sub": email}
+    if settings.auth_stateless:
+        claims = await auth_service.access_claims(await auth_service.load_user(email, db))
+    access_token = await auth_service.create_access_token(data=claims)
+    refresh_token = await auth_service.create_refresh_token(data={"sub": email}, family=family)
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
-    access_token = await auth_service.create_access_token(data={"sub": user.email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
 
-    await repository_user.update_token(user, refresh_token, db)
-    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(token: str = Depends(auth_service.oauth2_scheme)):
+    """
+        router to revoke current access token
+
+        :param token: access token of the request
+        :type token: str
+        :return: None
+        :rtype: None
+        """
+    await auth_service.revoke_access_token(token)
+
+
+@router.post("/logout_all", status_code=status.HTTP_204_NO_CONTENT)
+async def logout_all(cur_user: User = Depends(auth_service.get_current_user)):
+    """
+        router to revoke all refresh tokens of current user and invalidate its stateless access tokens
+
+        :param cur_user: current user
+        :type cur_user: User
+        :return: None
+        :rtype: None
+        """
+    await auth_service.revoke_refresh_tokens(cur_user.email)
+    await auth_service.bump_token_version(cur_user.id)
 
 
 @router.get("/confirmed_email/{token}")
@@ -137,5 +164,5 @@ async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, r
     if user.confirmed:
         return {"message": "Your email is already confirmed"}
     if user:
-        background_tasks.add_task(send_email, user.email, user.username, request.base_url)
+        background_tasks.add_task(traced(send_email), user.email, user.username, request.base_url)
     return {"message": "Check your email for confirmation."}
@@ -1,11 +1,13 @@
-from typing import List
+from typing import List, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi import APIRouter, Depends, status, HTTPException, Path
+from fastapi import APIRouter, Depends, status, HTTPException, Path, Query, Response
 
 from src.database.models import User
-from src.database.connector import get_db
+from src.database.connector import get_db, get_read_db
+from src.services import birthdays
 from src.services.auth import auth_service as auth
-from src.schemas import ContactResponse, ContactModel
+from src.services.fieldsets import fieldset, sparse_response
+from src.schemas import ContactResponse, ContactModel, ContactDetailResponse, ContactNoteResponse
 from src.repository import contacts as repository_contact
 
 router = APIRouter(prefix='/contacts', tags=['contacts'])
@@ -13,7 +15,10 @@ finder = APIRouter(prefix='/contacts/find', tags=['find'])
 
 
 @router.get("/", response_model=List[ContactResponse])
-async def get_all(cur_user: User = Depends(auth.get_current_user), db: AsyncSession = Depends(get_db)):
+async def get_all(skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=500),
+                  sort_by: str = Query("id", pattern="^-?(" + "|".join(repository_contact.SORT_FIELDS) + ")$"),
+                  fields: Tuple[str, ...] | None = Depends(fieldset(ContactResponse)),
+                  cur_user: User = Depends(auth.get_current_principal), db: AsyncSession = Depends(get_read_db)):
     """
         Returns a list of contacts with limits
 
@@ -21,6 +26,10 @@ async def get_all(cur_user: User = Depends(auth.get_current_user), db: AsyncSess
         :type skip: int
         :param limit: part of the number of contacts
         :type limit: int
+        :param sort_by: field to sort by, "-" prefix for descending order, e.g. -notes_count
+        :type sort_by: str
+        :param fields: only these fields are loaded and returned, e.g. first_name,last_name
+        :type fields: Tuple[str, ...] | None
         :param cur_user: current user - contact owner
         :type cur_user: User
         :param db: current async session to db
@@ -28,7 +37,9 @@ async def get_all(cur_user: User = Depends(auth.get_current_user), db: AsyncSess
         :return: Contact
         :rtype: Contact
         """
-    contacts = await repository_contact.get_all(cur_user, db)
+    contacts = await repository_contact.get_all(skip, limit, cur_user, db, sort_by=sort_by, fields=fields)
+    if fields:
+        return sparse_response(ContactResponse, fields, contacts)
     return contacts
 
 
@@ -52,28 +63,40 @@ async def create(body: ContactModel, cur_user: User = Depends(auth.get_current_u
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='some email use in ' + contact.last_name)
     else:
         contact = await repository_contact.create(body, cur_user, db)
+        await birthdays.invalidate(cur_user.id, auth.redis_db)
     return contact
 
 
-@router.get("/{contact_id}", response_model=ContactResponse)
-async def get_one(contact_id: int = Path(ge=1), cur_user: User = Depends(auth.get_current_user),
-                  db: AsyncSession = Depends(get_db)):
+@router.get("/{contact_id}", response_model=ContactDetailResponse, response_model_exclude_none=True)
+async def get_one(contact_id: int = Path(ge=1), include: str | None = Query(None, pattern="^notes$"),
+                  notes_limit: int = Query(10, ge=1, le=100), cur_user: User = Depends(auth.get_current_principal),
+                  db: AsyncSession = Depends(get_read_db)):
     """
-        route to get contact by id
+        route to get contact by id, with include=notes also its latest notes
 
         :param contact_id: id of contact to found
         :type contact_id: int
+        :param include: "notes" to embed latest notes of the contact
+        :type include: str | None
+        :param notes_limit: max number of embedded notes
+        :type notes_limit: int
         :param cur_user: current user - contact owner
         :type cur_user: User
         :param db: current async session to db
         :type db: AsyncSession
         :return: Contact
-        :rtype: Contact
+        :rtype: ContactDetailResponse
         """
-    contact = await repository_contact.get_one(contact_id, cur_user, db)
+    if include == "notes":
+        contact, notes = await repository_contact.get_one_with_notes(contact_id, notes_limit, cur_user, db)
+    else:
+        contact, notes = await repository_contact.get_one(contact_id, cur_user, db), None
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Not found')
-    return contact
+    response = ContactDetailResponse.model_validate(ContactResponse.model_validate(contact).model_dump())
+    if notes is not None:
+        response.notes = [ContactNoteResponse.model_validate(note) for note in notes]
+    return response
 
 
 @router.put("/{contact_id}", response_model=ContactResponse)
@@ -96,6 +119,7 @@ async def update(body: ContactModel, contact_id: int = Path(ge=1), cur_user: Use
     contact = await repository_contact.update(contact_id, body, cur_user, db)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Not found')
+    await birthdays.invalidate(cur_user.id, auth.redis_db)
     return contact
 
 
@@ -117,12 +141,13 @@ async def delete(contact_id: int = Path(ge=1), cur_user: User = Depends(auth.get
     contact = await repository_contact.delete(contact_id, cur_user, db)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Not found')
+    await birthdays.invalidate(cur_user.id, auth.redis_db)
     return contact
 
 
 @finder.get("name/{contact_name}", response_model=ContactResponse)
-async def find_by_name(contact_name: str, cur_user: User = Depends(auth.get_current_user),
-                       db: AsyncSession = Depends(get_db)):
+async def find_by_name(contact_name: str, cur_user: User = Depends(auth.get_current_principal),
+                       db: AsyncSession = Depends(get_read_db)):
     """
         route to get contact by contact name
 
@@ -142,8 +167,8 @@ async def find_by_name(contact_name: str, cur_user: User = Depends(auth.get_curr
 
 
 @finder.get("lastname/{lastname}", response_model=ContactResponse)
-async def find_by_name(lastname: str, cur_user: User = Depends(auth.get_current_user),
-                       db: AsyncSession = Depends(get_db)):
+async def find_by_name(lastname: str, cur_user: User = Depends(auth.get_current_principal),
+                       db: AsyncSession = Depends(get_read_db)):
     """
        route to get contact by lastname
 
@@ -163,7 +188,8 @@ async def find_by_name(lastname: str, cur_user: User = Depends(auth.get_current_
 
 
 @finder.get("email/{email}", response_model=ContactResponse)
-async def find_by_name(email: str, cur_user: User = Depends(auth.get_current_user), db: AsyncSession = Depends(get_db)):
+async def find_by_name(email: str, cur_user: User = Depends(auth.get_current_principal),
+                       db: AsyncSession = Depends(get_read_db)):
     """
         route to get contact by email address
 
@@ -183,9 +209,9 @@ async def find_by_name(email: str, cur_user: User = Depends(auth.get_current_use
 
 
 @finder.get("birthday/", response_model=List[ContactResponse])
-async def get_all(cur_user: User = Depends(auth.get_current_user), db: AsyncSession = Depends(get_db)):
+async def get_all(cur_user: User = Depends(auth.get_current_principal), db: AsyncSession = Depends(get_read_db)):
     """
-        route to get contact with bithday in 7 days
+        route to get contact with bithday in 7 days, served from the daily digest when it is built
 
         :param cur_user: current user - contact owner
         :type cur_user: User
@@ -194,5 +220,8 @@ async def get_all(cur_user: User = Depends(auth.get_current_user), db: AsyncSess
         :return: Contact
         :rtype: List
         """
+    cached = await birthdays.get_cached(cur_user.id, auth.redis_db)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
     contacts = await repository_contact.find_birthday7day(cur_user, db)
     return contacts
@@ -1,36 +1,60 @@
-from typing import List
-from fastapi import APIRouter, Depends, status, HTTPException, Path
+from datetime import datetime
+from typing import List, Tuple
+from fastapi import APIRouter, Depends, status, HTTPException, Path, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.conf.config import settings
 from src.database.models import User
-from src.database.connector import get_db
+from src.database.connector import get_db, get_read_db
 from src.repository import notes as repository_notes
 from src.services.auth import auth_service as auth
-from src.schemas import NoteResponse, NoteModel
+from src.services.fieldsets import fieldset, sparse_response
+from src.services.note_batcher import note_batcher
+from src.schemas import NoteResponse, NoteModel, NoteSearchResponse
 
 router = APIRouter(prefix='/note', tags=['note'])
 
 
 @router.get("/", response_model=List[NoteResponse])
-async def get_all(cur_user: User = Depends(auth.get_current_user), db: AsyncSession = Depends(get_db)):
+async def get_all(response: Response, contact_id: int | None = Query(None, ge=1), created_after: datetime | None = None,
+                  after_id: int | None = Query(None, ge=1), limit: int = Query(50, ge=1, le=200),
+                  fields: Tuple[str, ...] | None = Depends(fieldset(NoteResponse)),
+                  cur_user: User = Depends(auth.get_current_principal), db: AsyncSession = Depends(get_read_db)):
     """
-        get all notes
-
+        get page of notes, next page cursor is sent in X-Next-Cursor header
+
+        :param response: outgoing response
+        :type response: Response
+        :param contact_id: only notes of this contact
+        :type contact_id: int | None
+        :param created_after: only notes created after this moment
+        :type created_after: datetime | None
+        :param after_id: cursor from X-Next-Cursor of the previous page
+        :type after_id: int | None
+        :param limit: page size
+        :type limit: int
+        :param fields: only these fields are loaded and returned, e.g. id,text
+        :type fields: Tuple[str, ...] | None
         :param cur_user: current user - note owner
         :type cur_user: User
         :param db: current async session to db
         :type db: AsyncSession
-        :return: all notes in database for current user
+        :return: page of notes for current user
         :rtype: List
         """
-    notes = await repository_notes.get_all(cur_user, db)
+    notes = await repository_notes.get_all(cur_user, db, contact_id=contact_id, created_after=created_after,
+                                           after_id=after_id, limit=limit, fields=fields)
+    headers = {"X-Next-Cursor": str(notes[-1].id)} if len(notes) == limit else {}
+    if fields:
+        return sparse_response(NoteResponse, fields, notes, headers=headers)
+    response.headers.update(headers)
     return notes
 
 
 @router.post("/", response_model=NoteResponse, status_code=status.HTTP_201_CREATED)
 async def create(body: NoteModel, cur_user: User = Depends(auth.get_current_user), db: AsyncSession = Depends(get_db)):
     """
-        create new note by db id
+        create new note by db id, with note batching on the note is committed together with concurrent ones
 
         :param body: all need field to create
         :type body: NoteModel
@@ -41,13 +65,39 @@ async def create(body: NoteModel, cur_user: User = Depends(auth.get_current_user
         :return: Note | None
         :rtype: Note | None
         """
+    if settings.note_batch_enabled:
+        return await note_batcher.submit(body, cur_user)
     note = await repository_notes.create(body, cur_user, db)
     return note
 
 
+@router.get("/search", response_model=List[NoteSearchResponse])
+async def search(q: str = Query(min_length=1, max_length=200), skip: int = Query(0, ge=0),
+                 limit: int = Query(20, ge=1, le=100), cur_user: User = Depends(auth.get_current_principal),
+                 db: AsyncSession = Depends(get_read_db)):
+    """
+        full-text search in notes
+
+        :param q: words to search
+        :type q: str
+        :param skip: number of hits to skip
+        :type skip: int
+        :param limit: number of hits to return
+        :type limit: int
+        :param cur_user: current user - note owner
+        :type cur_user: User
+        :param db: current async session to db
+        :type db: AsyncSession
+        :return: ranked hits with highlighted snippets
+        :rtype: List
+        """
+    hits = await repository_notes.search(q, skip, limit, cur_user, db)
+    return hits
+
+
 @router.get("/{contact_id}", response_model=NoteResponse)
-async def get_one(contact_id: int = Path(ge=1), cur_user: User = Depends(auth.get_current_user),
-                  db: AsyncSession = Depends(get_db)):
+async def get_one(contact_id: int = Path(ge=1), cur_user: User = Depends(auth.get_current_principal),
+                  db: AsyncSession = Depends(get_read_db)):
     """
        get contact by db id
 
@@ -1,4 +1,6 @@
 from datetime import datetime
+from typing import List
+
 from pydantic import BaseModel, Field, EmailStr
 
 
@@ -50,11 +52,25 @@ class ContactResponse(ContactModel):
     email: EmailStr
     phone: str
     birthday: datetime
+    notes_count: int = 0
+
+    class Config:
+        from_attributes = True
+
+
+class ContactNoteResponse(BaseModel):
+    id: int
+    text: str
+    created_at: datetime | None = None
 
     class Config:
         from_attributes = True
 
 
+class ContactDetailResponse(ContactResponse):
+    notes: List[ContactNoteResponse] | None = None
+
+
 class NoteModel(BaseModel):
     text: str = Field(max_length=1000, min_length=1)
     contact_id: int = Field(1, gt=0)
@@ -69,5 +85,13 @@ class NoteResponse(NoteModel):
         from_attributes = True
 
 
+class NoteSearchResponse(BaseModel):
+    id: int
+    contact_id: int
+    text: str
+    snippet: str
+    rank: float
+
+
 class RequestEmail(BaseModel):
     email: EmailStr
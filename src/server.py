@@ -0,0 +1,107 @@
+import importlib
+import logging
+import os
+
+import uvicorn
+
+try:
+    from gunicorn.app.base import BaseApplication
+    from uvicorn.workers import UvicornWorker
+except ImportError:
+    BaseApplication = UvicornWorker = None
+
+APP = "main:app"
+
+
+def default_workers() -> int:
+    """
+        worker count derived from available CPUs, one event loop per core
+
+        :return: number of workers
+        :rtype: int
+        """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    return max(cpus, 1)
+
+
+if UvicornWorker is not None:
+    class ProductionWorker(UvicornWorker):
+        """
+            gunicorn worker running uvicorn on uvloop and httptools
+            """
+        CONFIG_KWARGS = {"loop": "uvloop", "http": "httptools"}
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            # cfg.worker_connections is 1000 by default, only a limit passed to run_production applies
+            limit_concurrency = getattr(self.app, "options", {}).get("worker_connections")
+            if limit_concurrency:
+                self.config.limit_concurrency = limit_concurrency
+
+    class ProductionServer(BaseApplication):
+        """
+            gunicorn master serving APP with ProductionWorker
+            """
+
+        def __init__(self, options: dict):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            module, _, attr = APP.partition(":")
+            return getattr(importlib.import_module(module), attr)
+
+
+def run_production(host: str, port: int, workers: int, keep_alive: int, backlog: int,
+                   limit_concurrency: int | None, graceful_timeout: int, preload: bool) -> None:
+    """
+        start the app in workers with uvloop and httptools.
+        Under gunicorn SIGHUP reloads workers gracefully and preload imports the app once in the master,
+        so workers share its code pages. Without gunicorn plain uvicorn workers are started.
+
+        :param host: interface to bind
+        :type host: str
+        :param port: port to bind
+        :type port: int
+        :param workers: number of worker processes
+        :type workers: int
+        :param keep_alive: seconds to keep idle connections open
+        :type keep_alive: int
+        :param backlog: max number of pending connections
+        :type backlog: int
+        :param limit_concurrency: max concurrent connections per worker before 503, None for no limit
+        :type limit_concurrency: int | None
+        :param graceful_timeout: seconds for workers to finish requests on reload or shutdown
+        :type graceful_timeout: int
+        :param preload: import the app in the master before forking workers
+        :type preload: bool
+        :return: None
+        :rtype: None
+        """
+    if UvicornWorker is None:
+        if preload:
+            logging.warning("preload needs gunicorn, starting uvicorn workers without it")
+        uvicorn.run(APP, host=host, port=port, workers=workers, loop="uvloop", http="httptools",
+                    timeout_keep_alive=keep_alive, backlog=backlog, limit_concurrency=limit_concurrency,
+                    timeout_graceful_shutdown=graceful_timeout, log_level="info")
+        return
+
+    options = {
+        "bind": f"{host}:{port}",
+        "workers": workers,
+        "worker_class": f"{__name__}.ProductionWorker",
+        "keepalive": keep_alive,
+        "backlog": backlog,
+        "graceful_timeout": graceful_timeout,
+        "preload_app": preload,
+    }
+    if limit_concurrency:
+        options["worker_connections"] = limit_concurrency
+    ProductionServer(options).run()
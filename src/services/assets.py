@@ -0,0 +1,228 @@
+import hashlib
+import mimetypes
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+
+from src.middleware.compression import negotiate
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+HASH_LENGTH = 12
+# precompressed variants looked up next to every asset, in order of preference
+VARIANTS = (("br", ".br"), ("gzip", ".gz"))
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+@dataclass
+class Asset:
+    """
+        file of the static directory with its content hash and precompressed variants
+        """
+    path: str
+    digest: str
+    hashed_name: str
+    media_type: str
+    variants: Dict[str, str] = field(default_factory=dict)
+
+    def etag(self, encoding: str | None = None) -> str:
+        """
+            :return: strong ETag of the asset or of its variant
+            :rtype: str
+            """
+        return f'"{self.digest}"' if encoding is None else f'"{self.digest}-{encoding}"'
+
+
+def hashed_name(name: str, digest: str) -> str:
+    """
+        :return: file name with the content hash before the extension, e.g. one.3f2a9c1b0d4e.png
+        :rtype: str
+        """
+    root, ext = os.path.splitext(name)
+    return f"{root}.{digest[:HASH_LENGTH]}{ext}"
+
+
+def build_manifest(directory: str) -> Dict[str, Asset]:
+    """
+        hash every file of directory and pick .br/.gz variants that are not older than their source
+
+        :param directory: static directory
+        :type directory: str
+        :return: assets by name relative to directory
+        :rtype: Dict[str, Asset]
+        """
+    manifest = {}
+    suffixes = tuple(suffix for _, suffix in VARIANTS)
+    for root, _, files in os.walk(directory):
+        for file in files:
+            path = os.path.join(root, file)
+            if file.endswith(suffixes) and os.path.exists(os.path.splitext(path)[0]):
+                continue
+            with open(path, "rb") as fh:
+                digest = hashlib.file_digest(fh, "sha256").hexdigest()
+            name = os.path.normpath(os.path.relpath(path, directory))
+            mtime = os.stat(path).st_mtime
+            variants = {encoding: path + suffix for encoding, suffix in VARIANTS
+                        if os.path.isfile(path + suffix) and os.stat(path + suffix).st_mtime >= mtime}
+            manifest[name] = Asset(path=path, digest=digest, hashed_name=hashed_name(name, digest),
+                                   media_type=mimetypes.guess_type(path)[0] or "text/plain", variants=variants)
+    return manifest
+
+
+def parse_range(header: str, size: int) -> Tuple[int, int] | None:
+    """
+        parse a single byte range, multiple ranges are not supported and served whole
+
+        :param header: Range header
+        :type header: str
+        :param size: file size
+        :type size: int
+        :return: offset and length, None for the whole file
+        :rtype: Tuple[int, int] | None
+        :raises ValueError: range is not satisfiable
+        """
+    match = RANGE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = min(int(last), size)
+        if length == 0:
+            raise ValueError(header)
+        return size - length, length
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, end - start + 1
+
+
+class AssetResponse(FileResponse):
+    """
+        file response for offset and length of the file,
+        sent with the ASGI zero-copy send extension when the server provides it
+        """
+
+    def __init__(self, path: str, offset: int = 0, length: int | None = None, **kwargs):
+        super().__init__(path, **kwargs)
+        self.offset = offset
+        self.length = length
+        if length is not None:
+            self.headers["content-length"] = str(length)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        length = self.stat_result.st_size - self.offset if self.length is None else self.length
+        if self.send_header_only:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({"type": "http.response.zerocopysend", "file": file.fileno(),
+                            "offset": self.offset, "count": length, "more_body": False})
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                await file.seek(self.offset)
+                remaining = length
+                while True:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    remaining -= len(chunk)
+                    more_body = remaining > 0 and len(chunk) > 0
+                    await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+                    if not more_body:
+                        break
+        if self.background is not None:
+            await self.background()
+
+
+class HashedStaticFiles(StaticFiles):
+    """
+        static files with content-hashed URLs.
+        name.<hash>.ext is cached forever, the plain name is revalidated with the content hash as ETag.
+        Precompressed .br/.gz variants found at startup are sent to clients accepting them,
+        single byte ranges are answered with 206.
+        Build links with request.url_for("static", path=static_files.asset_path("one.png")).
+
+        :param directory: static directory
+        :type directory: str
+        """
+
+    def __init__(self, *, directory: str, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.manifest = build_manifest(directory) if os.path.isdir(directory) else {}
+        self.hashed = {asset.hashed_name: asset for asset in self.manifest.values()}
+
+    def asset_path(self, name: str) -> str:
+        """
+            hashed path of an asset, unknown names are returned as is
+
+            :param name: path relative to the static directory
+            :type name: str
+            :return: path to use in URLs
+            :rtype: str
+            """
+        asset = self.manifest.get(os.path.normpath(name))
+        return name if asset is None else asset.hashed_name.replace(os.sep, "/")
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        asset = self.hashed.get(path)
+        cache_control = IMMUTABLE
+        if asset is None:
+            asset, cache_control = self.manifest.get(path), REVALIDATE
+        if asset is None or scope["method"] not in ("GET", "HEAD"):
+            return await super().get_response(path, scope)
+        try:
+            return await anyio.to_thread.run_sync(self.asset_response, asset, cache_control, scope)
+        except FileNotFoundError:
+            return await super().get_response(path, scope)
+
+    def asset_response(self, asset: Asset, cache_control: str, scope: Scope) -> Response:
+        """
+            response for an asset, a precompressed variant or a byte range of it.
+            Ranges are served from the uncompressed file.
+
+            :param asset: requested asset
+            :type asset: Asset
+            :param cache_control: Cache-Control header
+            :type cache_control: str
+            :param scope: request scope
+            :type scope: Scope
+            :return: response
+            :rtype: Response
+            """
+        request_headers = Headers(scope=scope)
+        headers = {"cache-control": cache_control, "etag": asset.etag(), "accept-ranges": "bytes"}
+        if asset.variants:
+            headers["vary"] = "Accept-Encoding"
+        stat_result = os.stat(asset.path)
+        kwargs = {"stat_result": stat_result, "method": scope["method"], "headers": headers,
+                  "media_type": asset.media_type}
+        range_header = request_headers.get("range")
+        if range_header and request_headers.get("if-range", asset.etag()) == asset.etag():
+            try:
+                byte_range = parse_range(range_header, stat_result.st_size)
+            except ValueError:
+                return Response(status_code=416, headers={"content-range": f"bytes */{stat_result.st_size}"})
+            if byte_range is not None:
+                offset, length = byte_range
+                headers["content-range"] = f"bytes {offset}-{offset + length - 1}/{stat_result.st_size}"
+                return AssetResponse(asset.path, offset=offset, length=length, status_code=206, **kwargs)
+        encoding = negotiate(request_headers.get("accept-encoding", ""), list(asset.variants))
+        if encoding is not None:
+            headers["content-encoding"] = encoding
+            headers["etag"] = asset.etag(encoding)
+            kwargs["stat_result"] = os.stat(asset.variants[encoding])
+            response = AssetResponse(asset.variants[encoding], **kwargs)
+        else:
+            response = AssetResponse(asset.path, **kwargs)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -1,28 +1,61 @@
 import logging
+import math
+import time
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from functools import cached_property
 from typing import Optional
 
-import redis as redis
-import pickle
+import uuid
+
+import redis.asyncio as redis
 
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import HTTPException, Depends, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from jose import jwt, JWTError
 
 from src.conf.config import settings
 from src.database.connector import get_db
+from src.database.shards import current_user_id
 from src.repository import users
 from src.conf import messages
+from src.services.cache import EarlyRefreshCache
+from src.services.revocation import RevocationList, TokenVersions
+from src.middleware.access_log import record_user
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+        user rebuilt from access token claims, enough for routes that only scope queries by user
+        """
+    id: int
+    name: str
+    email: str
+    confirmed: bool
 
 
 class Auth:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
     SECRET_KEY = settings.secret_key
     ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
-    redis_db = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+    redis_db: redis.Redis | None = None
+    revocation = RevocationList(settings.revocation_capacity, settings.revocation_error_rate,
+                                settings.revocation_sync_interval)
+    token_versions = TokenVersions(settings.revocation_sync_interval)
+    user_cache = EarlyRefreshCache(settings.user_cache_ttl, settings.user_cache_beta)
+
+    @cached_property
+    def pwd_context(self):
+        """
+            password hashing context, passlib is imported on first use
+
+            :return: hashing context
+            :rtype: CryptContext
+            """
+        from passlib.context import CryptContext
+
+        return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
     def create_email_token(self, data: dict):
         """
@@ -33,6 +66,8 @@ class Auth:
             :return: token for email
             :rtype: token
             """
+        from jose import jwt
+
         to_encode = data.copy()
         expire = datetime.utcnow() + timedelta(days=7)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire})
@@ -48,12 +83,14 @@ class Auth:
             :return: email
             :rtype: str
             """
+        from jose import jwt, JWTError
+
         try:
             payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
             email = payload["sub"]
             return email
         except JWTError as e:
-            print(e)
+            logging.info("invalid email token: %s", e)
             raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                                 detail="Invalid token for email verification")
 
@@ -81,17 +118,47 @@ class Auth:
             """
         return self.pwd_context.verify(plain_password, password_hash)
 
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    def verify_and_update(self, plain_password: str, password_hash: str) -> tuple[bool, str | None]:
         """
-            get user by token
+            verify password and rehash it when the hash doesn't match the current policy
 
-            :param token: token to get user
-            :type token: token
-            :param db: current session to db
-            :type db: Session
-            :return: user
-            :rtype: bool
+            :param plain_password: password
+            :type plain_password: str
+            :param password_hash: hashstring
+            :type password_hash: str
+            :return: verify result and new hash to store or None
+            :rtype: Tuple[bool, str | None]
             """
+        return self.pwd_context.verify_and_update(plain_password, password_hash)
+
+    def calibrate_password_hash(self, target_ms: int, min_rounds: int, max_rounds: int) -> int:
+        """
+            pick bcrypt rounds so one hash takes about target_ms on this machine.
+            Each round doubles the cost, so one timed hash at min_rounds is enough.
+            Hashes below the picked rounds are rehashed on next login, higher ones are kept.
+
+            :param target_ms: wanted hash latency in milliseconds
+            :type target_ms: int
+            :param min_rounds: lowest acceptable rounds whatever the hardware
+            :type min_rounds: int
+            :param max_rounds: highest rounds to pick
+            :type max_rounds: int
+            :return: rounds in use
+            :rtype: int
+            """
+        from passlib.hash import bcrypt
+
+        started = time.perf_counter()
+        bcrypt.using(rounds=min_rounds).hash("calibration")
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        rounds = min_rounds + (int(math.log2(target_ms / elapsed_ms)) if target_ms > elapsed_ms else 0)
+        rounds = min(rounds, max_rounds)
+        self.pwd_context.update(bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds)
+        logging.info("password hash calibrated to %d rounds, %.1f ms at %d rounds", rounds, elapsed_ms, min_rounds)
+        return rounds
+
+    async def _access_payload(self, token: str) -> dict:
+        from jose import jwt, JWTError
 
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -112,17 +179,99 @@ class Auth:
         except JWTError as e:
             logging.info(e)
             raise credentials_exception
-        user = self.redis_db.get(f"user:{email}")
-        if not user:
+        if "jti" in payload and await self.revocation.is_revoked(payload["jti"], self.redis_db):
+            raise credentials_exception
+        if "ver" in payload and not self.token_versions.is_current(payload["uid"], payload["ver"]):
+            raise credentials_exception
+        return payload
+
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+        """
+            get user by token, the user also picks the shard for the request's contacts and notes
+
+            :param token: token to get user
+            :type token: token
+            :param db: current session to db
+            :type db: Session
+            :return: user
+            :rtype: bool
+            """
+        user = await self.load_user((await self._access_payload(token))["sub"], db)
+        current_user_id.set(user.id)
+        record_user(user.id)
+        return user
+
+    async def load_user(self, email: str, db: AsyncSession):
+        """
+            get user by email through the redis cache,
+            concurrent misses for one email share a single query
+
+            :param email: user's email
+            :type email: str
+            :param db: current session to db
+            :type db: Session
+            :return: user
+            :rtype: User
+            """
+        if self.redis_db is None:
             user = await users.get_user_by_email(email, db)
-            if not user:
-                raise credentials_exception
-            await self.redis_db.set(f"user:{email}", pickle.dumps(user))
-            await self.redis_db.expire(f"user:{email}", 900)
         else:
-            user = pickle.loads(user)
+            user = await self.user_cache.get(self.redis_db, f"user_entry:{email}",
+                                             lambda: users.get_user_by_email(email, db))
+        if not user:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials",
+                                headers={"WWW-Authenticate": "Bearer"})
+        return user
+
+    async def get_current_principal(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+        """
+            get user by token for read-only routes.
+            Tokens issued in stateless mode carry the user in claims and are trusted
+            until the user's token version is bumped, other tokens fall back to get_current_user.
+
+            :param token: token to get user
+            :type token: token
+            :param db: current session to db
+            :type db: Session
+            :return: user
+            :rtype: Principal | User
+            """
+        payload = await self._access_payload(token)
+        if settings.auth_stateless and "ver" in payload:
+            current_user_id.set(payload["uid"])
+            record_user(payload["uid"])
+            return Principal(id=payload["uid"], name=payload["name"], email=payload["sub"],
+                             confirmed=payload["confirmed"])
+        user = await self.load_user(payload["sub"], db)
+        current_user_id.set(user.id)
+        record_user(user.id)
         return user
 
+    async def access_claims(self, user) -> dict:
+        """
+            claims for access token of user, in stateless mode they describe the user fully
+
+            :param user: user to issue token for
+            :type user: User | Principal
+            :return: data to be encoded
+            :rtype: dict
+            """
+        if not settings.auth_stateless:
+            return {"sub": user.email}
+        return {"sub": user.email, "uid": user.id, "name": user.name, "confirmed": user.confirmed,
+                "ver": await self.token_versions.get(user.id, self.redis_db)}
+
+    async def bump_token_version(self, user_id: int) -> None:
+        """
+            invalidate all access tokens of user, call on password change or logout from all devices
+
+            :param user_id: user id
+            :type user_id: int
+            :return: None
+            :rtype: None
+            """
+        await self.token_versions.bump(user_id, self._token_storage())
+
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
         """
             encode access token
@@ -134,37 +283,88 @@ class Auth:
             :return: token
             :rtype: token
              """
+        from jose import jwt
+
         to_encode = data.copy()
         if expires_delta:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
             expire = datetime.utcnow() + timedelta(minutes=15)
 
-        to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "access_token"})
-        encoded_access_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=[self.ALGORITHM])
+        to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "access_token", "jti": uuid.uuid4().hex})
+        encoded_access_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_access_token
 
-    async def create_refresh_token(self, data: dict, expires_delta: Optional[float] = None):
+    async def revoke_access_token(self, token: str) -> None:
         """
-           encode refresh token
+            revoke access token until it expires
+
+            :param token: access token
+            :type token: str
+            :return: None
+            :rtype: None
+            """
+        from jose import jwt, JWTError
+
+        try:
+            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+        except JWTError:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=messages.CLOUD_NOT_VALIDATE)
+        if "jti" in payload:
+            await self.revocation.revoke(payload["jti"], payload["exp"], self._token_storage())
+
+    def _token_storage(self) -> redis.Redis:
+        if self.redis_db is None:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail=messages.TOKEN_STORAGE_UNAVAILABLE)
+        return self.redis_db
+
+    async def create_refresh_token(self, data: dict, expires_delta: Optional[float] = None,
+                                   family: Optional[str] = None):
+        """
+           encode refresh token and register it in redis.
+           Every token gets a jti, tokens rotated from one login share a family.
 
            :param data: data to be encoded
            :type data: dict
            :param expires_delta: second to life token
            :type expires_delta: float
+           :param family: family of the rotated token, new family if None
+           :type family: str
            :return: token
            :rtype: token
            """
-        to_encode = data.copy()
-        if expires_delta:
-            expire = datetime.utcnow() + timedelta(seconds=expires_delta)
-        else:
-            expire = datetime.utcnow() + timedelta(days=1)
+        from jose import jwt
 
-        to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token"})
-        encoded_refresh_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=[self.ALGORITHM])
+        ttl = int(expires_delta or settings.refresh_token_ttl)
+        jti, family = uuid.uuid4().hex, family or uuid.uuid4().hex
+        email = data["sub"]
+        pipe = self._token_storage().pipeline(transaction=False)
+        pipe.set(f"refresh:{jti}", family, ex=ttl)
+        pipe.sadd(f"refresh_family:{family}", jti)
+        pipe.expire(f"refresh_family:{family}", ttl)
+        pipe.sadd(f"refresh_user:{email}", family)
+        pipe.expire(f"refresh_user:{email}", ttl)
+        await pipe.execute()
+
+        to_encode = data.copy()
+        expire = datetime.utcnow() + timedelta(seconds=ttl)
+        to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token", "jti": jti,
+                          "fam": family})
+        encoded_refresh_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_refresh_token
 
+    def _decode_refresh_payload(self, refresh_token: str) -> dict:
+        from jose import jwt, JWTError
+
+        try:
+            payload = jwt.decode(refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+        except JWTError:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=messages.CLOUD_NOT_VALIDATE)
+        if payload.get("scope") != "refresh_token":
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=messages.INVALID_SCOPE_TOKEN)
+        return payload
+
     async def decode_refresh_token(self, refresh_token: str):
         """
             decode refresh token
@@ -174,14 +374,57 @@ class Auth:
             :return: email address
             :rtype: str
             """
-        try:
-            payload = jwt.decode(refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload["scope"] == "refresh_token":
-                email = payload["sub"]
-                return email
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=messages.INVALID_SCOPE_TOKEN)
-        except JWTError:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=messages.CLOUD_NOT_VALIDATE)
+        return self._decode_refresh_payload(refresh_token)["sub"]
+
+    async def use_refresh_token(self, refresh_token: str):
+        """
+            mark refresh token as used, each token can be used once.
+            Reuse of a used token means it leaked, so its whole family is revoked.
+
+            :param refresh_token: token to use
+            :type refresh_token: str
+            :return: email address and family of the token
+            :rtype: Tuple[str, str]
+            """
+        payload = self._decode_refresh_payload(refresh_token)
+        jti, family = payload.get("jti"), payload.get("fam")
+        if not jti or not family:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=messages.INVALID_REFRESH_TOKEN)
+        previous = await self._token_storage().set(f"refresh:{jti}", "used", xx=True, get=True, keepttl=True)
+        if previous == b"used":
+            logging.warning("refresh token reuse for %s, revoking family %s", payload["sub"], family)
+            await self.revoke_refresh_family(family)
+        if previous is None or previous == b"used":
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=messages.INVALID_REFRESH_TOKEN)
+        return payload["sub"], family
+
+    async def revoke_refresh_family(self, family: str) -> None:
+        """
+            revoke all refresh tokens rotated from one login
+
+            :param family: family of tokens
+            :type family: str
+            :return: None
+            :rtype: None
+            """
+        storage = self._token_storage()
+        jtis = await storage.smembers(f"refresh_family:{family}")
+        await storage.delete(f"refresh_family:{family}", *(f"refresh:{jti.decode()}" for jti in jtis))
+
+    async def revoke_refresh_tokens(self, email: str) -> None:
+        """
+            revoke all refresh tokens of user
+
+            :param email: user's email
+            :type email: str
+            :return: None
+            :rtype: None
+            """
+        storage = self._token_storage()
+        families = await storage.smembers(f"refresh_user:{email}")
+        for family in families:
+            await self.revoke_refresh_family(family.decode())
+        await storage.delete(f"refresh_user:{email}")
 
 
 auth_service = Auth()
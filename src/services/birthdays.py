@@ -0,0 +1,132 @@
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List
+
+import redis.asyncio as redis
+from pydantic import TypeAdapter
+
+from src.database.models import Contact
+from src.middleware.access_log import record
+from src.schemas import ContactResponse
+
+DIGEST_DAYS = 7
+READY = "ready"
+
+contacts_adapter = TypeAdapter(List[ContactResponse])
+
+
+def digest_key(day: date) -> str:
+    """
+        redis hash with upcoming birthdays of every user for day, field per user id
+
+        :param day: day of the digest
+        :type day: date
+        :return: redis key
+        :rtype: str
+        """
+    return f"birthdays:{day.isoformat()}"
+
+
+def invalidated_key(day: date) -> str:
+    """
+        redis sorted set of users whose contacts changed on day, scored by the time of the change
+
+        :param day: day of the digest
+        :type day: date
+        :return: redis key
+        :rtype: str
+        """
+    return f"birthdays:{day.isoformat()}:invalidated"
+
+
+def _midnight_after(day: date) -> datetime:
+    return datetime.combine(day + timedelta(days=1), time.min)
+
+
+def serialize(contacts: List[Contact]) -> bytes:
+    """
+        contacts as the birthday route returns them
+
+        :param contacts: contacts to serialize
+        :type contacts: List[Contact]
+        :return: JSON array
+        :rtype: bytes
+        """
+    return contacts_adapter.dump_json(contacts_adapter.validate_python(contacts, from_attributes=True))
+
+
+async def store_digest(day: date, contacts_by_user: Dict[int, List[Contact]], redis_db: redis.Redis,
+                       started: float) -> None:
+    """
+        replace the digest of day, it expires at the next midnight.
+        Users without a field have no upcoming birthdays.
+        The digest is written under a temporary key and renamed, invalidations made before the build started
+        are dropped as the digest already has their changes, later ones keep their users on db.
+
+        :param day: day of the digest
+        :type day: date
+        :param contacts_by_user: contacts with upcoming birthday by owner id
+        :type contacts_by_user: Dict[int, List[Contact]]
+        :param redis_db: redis client
+        :type redis_db: redis.Redis
+        :param started: unix time the digest query started
+        :type started: float
+        :return: None
+        :rtype: None
+        """
+    key = digest_key(day)
+    building = f"{key}:building"
+    mapping = {user_id: serialize(contacts) for user_id, contacts in contacts_by_user.items()}
+    mapping[READY] = 1
+    pipe = redis_db.pipeline(transaction=True)
+    pipe.delete(building)
+    pipe.hset(building, mapping=mapping)
+    pipe.expireat(building, _midnight_after(day))
+    pipe.rename(building, key)
+    pipe.zremrangebyscore(invalidated_key(day), "-inf", f"({started}")
+    await pipe.execute()
+
+
+async def get_cached(user_id: int, redis_db: redis.Redis | None) -> bytes | None:
+    """
+        today's upcoming birthdays of user from the digest
+
+        :param user_id: contacts owner id
+        :type user_id: int
+        :param redis_db: redis client
+        :type redis_db: redis.Redis | None
+        :return: JSON array or None if the digest can't answer
+        :rtype: bytes | None
+        """
+    if redis_db is None:
+        return None
+    today = date.today()
+    pipe = redis_db.pipeline(transaction=False)
+    pipe.hmget(digest_key(today), [user_id, READY])
+    pipe.zscore(invalidated_key(today), user_id)
+    (value, ready), invalidated_at = await pipe.execute()
+    if invalidated_at is not None:
+        value = None
+    elif value is None:
+        value = b"[]" if ready else None
+    record("cache_hits" if value else "cache_misses")
+    return value or None
+
+
+async def invalidate(user_id: int, redis_db: redis.Redis | None) -> None:
+    """
+        make the digest fall back to db for user until a run started after now, call when user's contacts change
+
+        :param user_id: contacts owner id
+        :type user_id: int
+        :param redis_db: redis client
+        :type redis_db: redis.Redis | None
+        :return: None
+        :rtype: None
+        """
+    if redis_db is None:
+        return
+    today = date.today()
+    pipe = redis_db.pipeline(transaction=True)
+    pipe.zadd(invalidated_key(today), {user_id: datetime.now().timestamp()})
+    pipe.expireat(invalidated_key(today), _midnight_after(today))
+    await pipe.execute()
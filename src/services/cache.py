@@ -0,0 +1,113 @@
+import asyncio
+import math
+import pickle
+import random
+import time
+from typing import Any, Awaitable, Callable, Hashable
+
+import redis.asyncio as redis
+
+from src.middleware.access_log import record
+
+
+class SingleFlight:
+    """
+        coalesce concurrent calls with the same key into one in-flight call.
+        The call runs as its own task, so a cancelled caller doesn't cancel it for the others.
+        """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Task] = {}
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+            run fn or join the call already running for key
+
+            :param key: key of the call
+            :type key: Hashable
+            :param fn: coroutine function to run
+            :type fn: Callable[[], Awaitable[Any]]
+            :return: result of fn
+            :rtype: Any
+            """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+
+class EarlyRefreshCache:
+    """
+        values pickled in redis, recomputed through SingleFlight on a miss.
+        Entries are refreshed before expiry with probability growing as expiry nears and
+        with the time the value took to compute (XFetch), so a popular key is usually
+        refreshed by one request before it expires instead of by all of them after.
+
+        :param ttl: seconds to keep a value
+        :type ttl: int
+        :param beta: eagerness of early refresh, 1 is the usual choice, larger refreshes earlier
+        :type beta: float
+        """
+
+    def __init__(self, ttl: int, beta: float = 1.0):
+        self.ttl = ttl
+        self.beta = beta
+        self.flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.early_refreshes = 0
+
+    @property
+    def stats(self) -> dict:
+        """
+            counters since start
+
+            :return: hits, misses, early refreshes and coalesced waits
+            :rtype: dict
+            """
+        return {"hits": self.hits, "misses": self.misses, "early_refreshes": self.early_refreshes,
+                "coalesced": self.flight.coalesced}
+
+    def _should_refresh(self, entry: dict) -> bool:
+        return time.time() - entry["delta"] * self.beta * math.log(1.0 - random.random()) >= entry["expiry"]
+
+    async def get(self, redis_db: redis.Redis, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+            get value by key, fetch and store it when missing or picked for early refresh.
+            None from fetch is returned but not stored.
+
+            :param redis_db: redis client
+            :type redis_db: redis.Redis
+            :param key: redis key
+            :type key: str
+            :param fetch: coroutine function computing the value
+            :type fetch: Callable[[], Awaitable[Any]]
+            :return: value
+            :rtype: Any
+            """
+        raw = await redis_db.get(key)
+        if raw is None:
+            self.misses += 1
+            record("cache_misses")
+        else:
+            entry = pickle.loads(raw)
+            if not self._should_refresh(entry):
+                self.hits += 1
+                record("cache_hits")
+                return entry["value"]
+            record("cache_misses")
+            self.early_refreshes += 1
+        return await self.flight.do(key, lambda: self._recompute(redis_db, key, fetch))
+
+    async def _recompute(self, redis_db: redis.Redis, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        started = time.monotonic()
+        value = await fetch()
+        if value is not None:
+            entry = {"value": value, "delta": time.monotonic() - started, "expiry": time.time() + self.ttl}
+            await redis_db.set(key, pickle.dumps(entry), ex=self.ttl)
+        return value
@@ -1,24 +1,50 @@
+import logging
 from pathlib import Path
 
-from fastapi_mail import ConnectionConfig, FastMail, MessageSchema, MessageType
-from fastapi_mail.errors import ConnectionErrors
-
 from src.conf.config import settings
+from src.middleware.tracing import span
 from src.services.auth import auth_service
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.mail_username,
-    MAIL_PASSWORD=settings.mail_password,
-    MAIL_FROM=settings.mail_from,
-    MAIL_SERVER=settings.mail_server,
-    MAIL_PORT=settings.mail_port,
-    MAIL_FROM_NAME='MY FAST API HW',
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
-)
+mail_sender = None
+
+
+def get_mail_sender():
+    """
+        shared mail sender, fastapi_mail is imported and configured on first use
+
+        :return: mail sender
+        :rtype: FastMail
+        """
+    global mail_sender
+    if mail_sender is None:
+        from fastapi_mail import ConnectionConfig, FastMail
+
+        conf = ConnectionConfig(
+            MAIL_USERNAME=settings.mail_username,
+            MAIL_PASSWORD=settings.mail_password,
+            MAIL_FROM=settings.mail_from,
+            MAIL_SERVER=settings.mail_server,
+            MAIL_PORT=settings.mail_port,
+            MAIL_FROM_NAME='MY FAST API HW',
+            MAIL_STARTTLS=False,
+            MAIL_SSL_TLS=True,
+            USE_CREDENTIALS=True,
+            VALIDATE_CERTS=True,
+            TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
+        )
+        mail_sender = FastMail(conf)
+    return mail_sender
+
+
+def close_mail() -> None:
+    """
+        drop the shared mail sender
+
+        :return: None
+        :rtype: None
+        """
+    global mail_sender
+    mail_sender = None
 
 
 async def send_email(email: str, username: str, host: str):
@@ -34,6 +60,9 @@ async def send_email(email: str, username: str, host: str):
         :return: None
         :rtype: None
         """
+    from fastapi_mail import MessageSchema, MessageType
+    from fastapi_mail.errors import ConnectionErrors
+
     try:
         token_verification = auth_service.create_email_token({"sub": email})
         message = MessageSchema(
@@ -43,8 +72,43 @@ async def send_email(email: str, username: str, host: str):
             subtype=MessageType.html
         )
 
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_template.html")
+        fm = get_mail_sender()
+        with span("smtp send", template="email_template.html"):
+            await fm.send_message(message, template_name="email_template.html")
+
+    except ConnectionErrors as err:
+        logging.warning("confirmation email to %s failed: %s", email, err)
+
+
+async def send_birthday_digest(email: str, username: str, contacts: list):
+    """
+        Sends one email listing all upcoming birthdays of user's contacts
+
+        :param email: email to send
+        :type email: EmailStr
+        :param username: username from db
+        :type username: str
+        :param contacts: contacts with upcoming birthday
+        :type contacts: List[Contact]
+        :return: None
+        :rtype: None
+        """
+    from fastapi_mail import MessageSchema, MessageType
+    from fastapi_mail.errors import ConnectionErrors
+
+    try:
+        message = MessageSchema(
+            subject="Upcoming birthdays",
+            recipients=[email],
+            template_body={"username": username,
+                           "contacts": [{"name": f"{contact.first_name} {contact.last_name}",
+                                         "birthday": contact.birthday.strftime("%d %B")} for contact in contacts]},
+            subtype=MessageType.html
+        )
+
+        fm = get_mail_sender()
+        with span("smtp send", template="birthday_digest.html"):
+            await fm.send_message(message, template_name="birthday_digest.html")
 
     except ConnectionErrors as err:
-        print(err)
+        logging.warning("birthday digest to %s failed: %s", email, err)
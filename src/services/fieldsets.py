@@ -0,0 +1,69 @@
+from functools import lru_cache
+from typing import Callable, List, Tuple, Type
+
+from fastapi import HTTPException, Query, Response, status
+from pydantic import BaseModel, ConfigDict, TypeAdapter, create_model
+
+
+def fieldset(model: Type[BaseModel]) -> Callable[[str | None], Tuple[str, ...] | None]:
+    """
+        dependency parsing the fields query parameter against the fields of model.
+        id is always included, fields keep the order of model.
+
+        :param model: full response model
+        :type model: Type[BaseModel]
+        :return: dependency returning field names or None for all fields
+        :rtype: Callable[[str | None], Tuple[str, ...] | None]
+        """
+    allowed = list(model.model_fields)
+
+    def dependency(fields: str | None = Query(None, pattern=r"^\w+(,\w+)*$",
+                                              description=f"comma separated subset of {', '.join(allowed)}")):
+        if fields is None:
+            return None
+        requested = set(fields.split(",")) | {"id"}
+        unknown = requested - set(allowed)
+        if unknown:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                                detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        return tuple(name for name in allowed if name in requested)
+
+    return dependency
+
+
+@lru_cache(maxsize=256)
+def sparse_adapter(model: Type[BaseModel], fields: Tuple[str, ...]) -> TypeAdapter:
+    """
+        adapter for a list of model trimmed to fields, built once per field set
+
+        :param model: full response model
+        :type model: Type[BaseModel]
+        :param fields: field names to keep
+        :type fields: Tuple[str, ...]
+        :return: adapter validating ORM objects
+        :rtype: TypeAdapter
+        """
+    sparse = create_model(f"{model.__name__}[{','.join(fields)}]", __config__=ConfigDict(from_attributes=True),
+                          **{name: (model.model_fields[name].annotation, model.model_fields[name]) for name in fields})
+    return TypeAdapter(List[sparse])
+
+
+def sparse_response(model: Type[BaseModel], fields: Tuple[str, ...], items: list,
+                    headers: dict | None = None) -> Response:
+    """
+        JSON response with only fields of every item
+
+        :param model: full response model
+        :type model: Type[BaseModel]
+        :param fields: field names to keep
+        :type fields: Tuple[str, ...]
+        :param items: ORM objects
+        :type items: list
+        :param headers: response headers
+        :type headers: dict | None
+        :return: response
+        :rtype: Response
+        """
+    adapter = sparse_adapter(model, fields)
+    return Response(content=adapter.dump_json(adapter.validate_python(items, from_attributes=True)),
+                    media_type="application/json", headers=headers)
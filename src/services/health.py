@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import time
+from typing import Callable, List
+
+import redis.asyncio as redis
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+from src.conf.config import settings
+from src.database import connector, shards
+
+logger = logging.getLogger(__name__)
+
+
+def _engines() -> List[Engine]:
+    return [connector.get_engine(), *shards.router.engines]
+
+
+def pool_saturation(engine: Engine) -> float | None:
+    """
+        share of the connections a pool may open that are checked out
+
+        :param engine: engine
+        :type engine: Engine
+        :return: saturation from 0 to 1, None for pools without a limit
+        :rtype: float | None
+        """
+    pool = engine.pool
+    if not isinstance(pool, QueuePool) or pool._max_overflow < 0:
+        return None
+    return pool.checkedout() / (pool.size() + pool._max_overflow)
+
+
+class HealthMonitor:
+    """
+        readiness of the app checked in the background, so probes read a cached result
+        and never take a database connection away from requests.
+        The app is ready when the primary and shard databases answer, redis answers,
+        no pool is saturated and the last check is not older than three intervals.
+
+        :param interval: seconds between checks
+        :type interval: float
+        :param timeout: seconds a database or redis check may take
+        :type timeout: float
+        :param max_saturation: pool saturation above which the app is not ready
+        :type max_saturation: float
+        :param engines: engines to check
+        :type engines: Callable[[], List[Engine]]
+        """
+
+    def __init__(self, interval: float, timeout: float, max_saturation: float,
+                 engines: Callable[[], List[Engine]] = _engines):
+        self.interval = interval
+        self.timeout = timeout
+        self.max_saturation = max_saturation
+        self.engines = engines
+        self.checks = {}
+        self.checked_at: float | None = None
+
+    @property
+    def ready(self) -> bool:
+        """
+            :return: all checks of a recent run passed
+            :rtype: bool
+            """
+        if self.checked_at is None or time.monotonic() - self.checked_at > 3 * self.interval:
+            return False
+        return all(check["ok"] for check in self.checks.values())
+
+    @property
+    def report(self) -> dict:
+        """
+            :return: status and result of every check of the last run
+            :rtype: dict
+            """
+        age = None if self.checked_at is None else round(time.monotonic() - self.checked_at, 3)
+        return {"status": "ok" if self.ready else "unavailable", "age": age, "checks": self.checks}
+
+    @staticmethod
+    def _ping_databases(engines: List[Engine]) -> None:
+        for engine in engines:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+
+    async def check(self, redis_db: redis.Redis | None) -> dict:
+        """
+            run all checks once and cache the result
+
+            :param redis_db: redis client, None before startup
+            :type redis_db: redis.Redis | None
+            :return: report
+            :rtype: dict
+            """
+        engines = self.engines()
+        checks = {}
+        try:
+            await asyncio.wait_for(asyncio.to_thread(self._ping_databases, engines), self.timeout)
+            checks["database"] = {"ok": True}
+        except Exception as err:
+            checks["database"] = {"ok": False, "error": repr(err)}
+        try:
+            if redis_db is None:
+                raise ConnectionError("redis is not connected")
+            await asyncio.wait_for(redis_db.ping(), self.timeout)
+            checks["redis"] = {"ok": True}
+        except Exception as err:
+            checks["redis"] = {"ok": False, "error": repr(err)}
+        saturation = max((value for value in map(pool_saturation, engines) if value is not None), default=0.0)
+        checks["pool"] = {"ok": saturation < self.max_saturation, "saturation": round(saturation, 3)}
+        for name, result in checks.items():
+            if not result["ok"] and self.checks.get(name, {}).get("ok", True):
+                logger.warning("health check %s failed: %s", name, result)
+        self.checks, self.checked_at = checks, time.monotonic()
+        return self.report
+
+    async def run(self, redis_db: redis.Redis | None) -> None:
+        """
+            check forever, run as a background task
+
+            :param redis_db: redis client
+            :type redis_db: redis.Redis | None
+            :return: None
+            :rtype: None
+            """
+        while True:
+            try:
+                await self.check(redis_db)
+            except Exception as err:
+                logger.warning("health check failed: %s", err)
+            await asyncio.sleep(self.interval)
+
+
+health_monitor = HealthMonitor(settings.health_check_interval, settings.health_check_timeout,
+                               settings.health_max_pool_saturation)
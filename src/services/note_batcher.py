@@ -0,0 +1,190 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import Counter, defaultdict
+from typing import Callable, List, Tuple
+
+from sqlalchemy import and_, bindparam, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from src.conf.config import settings
+from src.database import shards
+from src.database.connector import DBSession, get_engine
+from src.database.models import Contact, Note, User
+from src.middleware import tracing
+from src.schemas import NoteModel
+
+BATCH_SIZE_BUCKETS = (1, 4, 16, 64, 256)
+
+
+def _session_factory(shard: str | None) -> Session:
+    return DBSession(info={"shard": shard}, expire_on_commit=False)
+
+
+class NoteWriteBatcher:
+    """
+        group commit for note creation.
+        Notes submitted within max_delay_ms of the first pending one, or until max_batch are pending,
+        are written with one multi-row INSERT ... RETURNING, one notes_count UPDATE per contact and one commit
+        per shard; every caller gets its own row. A failed batch is retried row by row,
+        so a bad note fails only its own caller.
+
+        :param max_delay_ms: longest time a note waits for others before the batch is written
+        :type max_delay_ms: float
+        :param max_batch: batch size that is written without waiting
+        :type max_batch: int
+        :param session_factory: session for a shard name, None when sharding is off
+        :type session_factory: Callable[[str | None], Session]
+        """
+
+    def __init__(self, max_delay_ms: float, max_batch: int,
+                 session_factory: Callable[[str | None], Session] = _session_factory):
+        self.max_delay = max_delay_ms / 1000
+        self.max_batch = max_batch
+        self.session_factory = session_factory
+        # values, caller's future, queued at and link to the caller's span
+        self._pending: List[Tuple[dict, asyncio.Future, float, object]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._writes = set()
+        self.batches = 0
+        self.notes = 0
+        self.largest_batch = 0
+        self.max_wait = 0.0
+        self.batch_sizes = Counter()
+
+    @property
+    def stats(self) -> dict:
+        """
+            counters since start
+
+            :return: batches, notes, largest batch, longest wait in ms and batches by size bucket
+            :rtype: dict
+            """
+        batch_sizes = {f"<={bucket}": self.batch_sizes[bucket] for bucket in BATCH_SIZE_BUCKETS}
+        batch_sizes[f">{BATCH_SIZE_BUCKETS[-1]}"] = self.batch_sizes[None]
+        return {"batches": self.batches, "notes": self.notes, "largest_batch": self.largest_batch,
+                "max_wait_ms": round(self.max_wait * 1000, 3), "batch_sizes": batch_sizes}
+
+    async def submit(self, body: NoteModel, user: User) -> Note:
+        """
+            queue a note and wait for the batch holding it to be committed
+
+            :param body: all parameters for new note
+            :type body: NoteModel
+            :param user: current user - contact owner
+            :type user: User
+            :return: created note with its contact loaded
+            :rtype: Note
+            """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(({**body.model_dump(), "user_id": user.id}, future, time.monotonic(),
+                              tracing.current_link()))
+        if len(self._pending) >= self.max_batch:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self.flush)
+        return await future
+
+    def flush(self) -> None:
+        """
+            start writing all pending notes now
+
+            :return: None
+            :rtype: None
+            """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            # fresh context: the batch serves many requests and must not inherit the deadline of one of them
+            task = asyncio.create_task(self._write(batch), context=contextvars.Context())
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    async def close(self) -> None:
+        """
+            write pending notes and wait for writes in progress, call on shutdown
+
+            :return: None
+            :rtype: None
+            """
+        self.flush()
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    async def _write(self, batch: List[Tuple[dict, asyncio.Future, float, object]]) -> None:
+        started = time.monotonic()
+        self.batches += 1
+        self.notes += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        self.max_wait = max(self.max_wait, started - min(queued for _, _, queued, _ in batch))
+        self.batch_sizes[next((bucket for bucket in BATCH_SIZE_BUCKETS if len(batch) <= bucket), None)] += 1
+        links = [link for _, _, _, link in batch if link is not None]
+        with tracing.span("note batch", links=links, notes=len(batch)):
+            try:
+                results = await asyncio.to_thread(self._write_sync, [values for values, _, _, _ in batch])
+            except Exception as err:
+                results = [err] * len(batch)
+        for (_, future, _, _), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _write_sync(self, rows: List[dict]) -> List[Note | Exception]:
+        by_shard = defaultdict(list)
+        for index, values in enumerate(rows):
+            shard = shards.router.shard_for(values["user_id"], get_engine()) if shards.router.enabled else None
+            by_shard[shard].append(index)
+        results: List[Note | Exception] = [None] * len(rows)
+        for shard, indexes in by_shard.items():
+            db = self.session_factory(shard)
+            try:
+                try:
+                    notes = self._insert(db, [rows[index] for index in indexes])
+                except SQLAlchemyError as err:
+                    db.rollback()
+                    logging.warning("note batch of %d failed, writing notes one by one: %s", len(indexes), err)
+                    notes = []
+                    for index in indexes:
+                        try:
+                            notes.extend(self._insert(db, [rows[index]]))
+                        except SQLAlchemyError as row_err:
+                            db.rollback()
+                            notes.append(row_err)
+                for index, note in zip(indexes, notes):
+                    results[index] = note
+            finally:
+                db.close()
+        return results
+
+    @staticmethod
+    def _insert(db: Session, rows: List[dict]) -> List[Note]:
+        notes = db.scalars(insert(Note).returning(Note, sort_by_parameter_order=True), rows).all()
+        increments = Counter((values["contact_id"], values["user_id"]) for values in rows)
+        contacts = Contact.__table__
+        db.execute(
+            contacts.update()
+            .where(and_(contacts.c.id == bindparam("b_contact_id"), contacts.c.user_id == bindparam("b_user_id")))
+            .values(notes_count=contacts.c.notes_count + bindparam("b_increment")),
+            [{"b_contact_id": contact_id, "b_user_id": user_id, "b_increment": increment}
+             for (contact_id, user_id), increment in increments.items()],
+        )
+        db.commit()
+        loaded = {contact.id: contact for contact in
+                  db.scalars(select(Contact).where(Contact.id.in_({note.contact_id for note in notes})))}
+        for note in notes:
+            set_committed_value(note, "contact", loaded.get(note.contact_id))
+        # detach the written rows so a rollback of a later row can't expire them
+        db.expunge_all()
+        return notes
+
+
+note_batcher = NoteWriteBatcher(settings.note_batch_max_delay_ms, settings.note_batch_max_size)
@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from abc import ABC, abstractmethod
+
+import redis.asyncio as redis
+
+
+class BloomFilter:
+    """
+        set of strings with false positives but no false negatives
+
+        :param capacity: expected number of items
+        :type capacity: int
+        :param error_rate: false positive rate at capacity
+        :type error_rate: float
+        """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RedisMirror(ABC):
+    """
+        in-process copy of state kept in redis, refreshed every sync_interval seconds
+        """
+    sync_interval: int
+
+    @abstractmethod
+    async def sync(self, redis_db: redis.Redis) -> None:
+        """
+            refresh the in-process copy from redis
+
+            :param redis_db: redis client
+            :type redis_db: redis.Redis
+            :return: None
+            :rtype: None
+            """
+
+    async def run_sync(self, redis_db: redis.Redis) -> None:
+        """
+            sync forever, run as a background task
+
+            :param redis_db: redis client
+            :type redis_db: redis.Redis
+            :return: None
+            :rtype: None
+            """
+        while True:
+            try:
+                await self.sync(redis_db)
+            except redis.RedisError as err:
+                logging.warning("%s sync failed: %s", type(self).__name__, err)
+            await asyncio.sleep(self.sync_interval)
+
+
+class RevocationList(RedisMirror):
+    """
+        revoked access token ids.
+        Redis sorted set revoked_tokens is the source of truth, each jti scored by the expiration of its token;
+        syncs read the live ones by score and prune the expired ones, without scanning the keyspace.
+        An in-process Bloom filter rebuilt from redis every sync_interval seconds answers
+        "not revoked" for almost every token without a network round trip;
+        a token revoked in another worker is seen here after the next sync.
+
+        :param capacity: expected number of revoked tokens alive at once
+        :type capacity: int
+        :param error_rate: share of valid tokens that still need a redis lookup
+        :type error_rate: float
+        :param sync_interval: seconds between rebuilds of the filter
+        :type sync_interval: int
+        """
+    KEY = "revoked_tokens"
+
+    def __init__(self, capacity: int, error_rate: float, sync_interval: int):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.filter = BloomFilter(capacity, error_rate)
+        self._revoked_during_sync = []
+
+    async def revoke(self, jti: str, expires_at: float, redis_db: redis.Redis) -> None:
+        """
+            revoke token until its expiration
+
+            :param jti: token id
+            :type jti: str
+            :param expires_at: token expiration, unix time
+            :type expires_at: float
+            :param redis_db: redis client
+            :type redis_db: redis.Redis
+            :return: None
+            :rtype: None
+            """
+        if expires_at <= time.time():
+            return
+        await redis_db.zadd(self.KEY, {jti: expires_at})
+        self.filter.add(jti)
+        self._revoked_during_sync.append(jti)
+
+    async def is_revoked(self, jti: str, redis_db: redis.Redis | None) -> bool:
+        """
+            check token id, redis is asked only when the filter can't rule the token out
+
+            :param jti: token id
+            :type jti: str
+            :param redis_db: redis client
+            :type redis_db: redis.Redis | None
+            :return: True if token is revoked
+            :rtype: bool
+            """
+        if jti not in self.filter or redis_db is None:
+            return False
+        expires_at = await redis_db.zscore(self.KEY, jti)
+        return expires_at is not None and expires_at > time.time()
+
+    async def sync(self, redis_db: redis.Redis) -> None:
+        """
+            rebuild the filter from token ids revoked until after now and drop the expired ones from redis
+
+            :param redis_db: redis client
+            :type redis_db: redis.Redis
+            :return: None
+            :rtype: None
+            """
+        fresh = BloomFilter(self.capacity, self.error_rate)
+        self._revoked_during_sync = []
+        now = time.time()
+        await redis_db.zremrangebyscore(self.KEY, "-inf", now)
+        for jti in await redis_db.zrangebyscore(self.KEY, now, "+inf"):
+            fresh.add(jti.decode())
+        for jti in self._revoked_during_sync:
+            fresh.add(jti)
+        self.filter = fresh
+
+
+class TokenVersions(RedisMirror):
+    """
+        minimal valid access token version of each user.
+        Redis hash token_versions is the source of truth, users who never bumped their version are at 0.
+        Bumping the version invalidates every access token issued before, the in-process copy
+        makes the check free; another worker sees a bump after the next sync.
+
+        :param sync_interval: seconds between syncs of the local copy
+        :type sync_interval: int
+        """
+    KEY = "token_versions"
+
+    def __init__(self, sync_interval: int):
+        self.sync_interval = sync_interval
+        self.versions = {}
+
+    def is_current(self, user_id: int, version: int) -> bool:
+        """
+            check token version against the local copy
+
+            :param user_id: user id
+            :type user_id: int
+            :param version: version of the token
+            :type version: int
+            :return: True if token was issued after the last bump
+            :rtype: bool
+            """
+        return version >= self.versions.get(user_id, 0)
+
+    async def get(self, user_id: int, redis_db: redis.Redis | None) -> int:
+        """
+            current version of user to put in new tokens
+
+            :param user_id: user id
+            :type user_id: int
+            :param redis_db: redis client
+            :type redis_db: redis.Redis | None
+            :return: version
+            :rtype: int
+            """
+        if redis_db is None:
+            return self.versions.get(user_id, 0)
+        version = int(await redis_db.hget(self.KEY, user_id) or 0)
+        self.versions[user_id] = max(version, self.versions.get(user_id, 0))
+        return version
+
+    async def bump(self, user_id: int, redis_db: redis.Redis) -> int:
+        """
+            invalidate all access tokens of user issued so far
+
+            :param user_id: user id
+            :type user_id: int
+            :param redis_db: redis client
+            :type redis_db: redis.Redis
+            :return: new version
+            :rtype: int
+            """
+        version = await redis_db.hincrby(self.KEY, user_id, 1)
+        self.versions[user_id] = version
+        return version
+
+    async def sync(self, redis_db: redis.Redis) -> None:
+        """
+            replace the local copy with versions from redis
+
+            :param redis_db: redis client
+            :type redis_db: redis.Redis
+            :return: None
+            :rtype: None
+            """
+        raw = await redis_db.hgetall(self.KEY)
+        self.versions = {int(user_id): int(version) for user_id, version in raw.items()}
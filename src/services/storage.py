@@ -0,0 +1,45 @@
+from src.conf.config import settings
+from src.middleware.tracing import span
+
+_configured = False
+
+
+def init_storage() -> None:
+    """
+        configure the cloudinary client once per process, cloudinary is imported on first use
+
+        :return: None
+        :rtype: None
+        """
+    global _configured
+    if _configured:
+        return
+    import cloudinary
+
+    cloudinary.config(
+        cloud_name=settings.cloudinary_name,
+        api_key=settings.cloudinary_api_key,
+        api_secret=settings.cloudinary_api_secret,
+        secure=True
+    )
+    _configured = True
+
+
+def upload_avatar(file, public_id: str) -> str:
+    """
+        upload avatar image and build url of its 250x250 crop
+
+        :param file: file-like object with image
+        :type file: BinaryIO
+        :param public_id: cloudinary id of the image
+        :type public_id: str
+        :return: url of the avatar
+        :rtype: str
+        """
+    init_storage()
+    import cloudinary
+    import cloudinary.uploader
+
+    with span("cloudinary upload", public_id=public_id):
+        cloudinary.uploader.upload(file, public_id=public_id, overwrite=True)
+    return cloudinary.CloudinaryImage(public_id).build_url(width=250, height=250, crop='fill')
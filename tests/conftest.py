@@ -7,7 +7,7 @@ from sqlalchemy.orm import sessionmaker
 
 from main import app
 from src.database.models import Base
-from src.database.connector import get_db
+from src.database.connector import get_db, get_read_db
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 
@@ -39,6 +39,7 @@ def client(session):
             session.close()
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
 
     yield TestClient(app)
 
@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+IMPORT_TIME_BUDGET_US = int(os.environ.get("IMPORT_TIME_BUDGET_US", 2_000_000))
+LAZY_MODULES = ("cloudinary", "fastapi_mail", "passlib", "jose", "psycopg2", "opentelemetry")
+
+
+def measure_import(module: str = "main") -> dict:
+    """
+        import module in a fresh interpreter with -X importtime
+
+        :param module: module to import
+        :type module: str
+        :return: cumulative import time in microseconds for every imported module
+        :rtype: dict
+        """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        timings.setdefault(name.strip(), int(cumulative))
+    return timings
+
+
+def test_import_main_within_budget():
+    timings = measure_import()
+    assert timings["main"] <= IMPORT_TIME_BUDGET_US, f"import main took {timings['main']}us"
+
+
+def test_import_main_skips_lazy_modules():
+    timings = measure_import()
+    assert [name for name in LAZY_MODULES if name in timings] == []
+
+
+if __name__ == '__main__':
+    for name, cumulative in sorted(measure_import().items(), key=lambda item: item[1], reverse=True)[:25]:
+        print(f"{cumulative:>10} us  {name}")
@@ -67,3 +67,24 @@ def test_login_wrong_email(client, user):
     assert response.status_code == 401, response.text
     data = response.json()
     assert data["detail"] == "Invalid email"
+
+
+def test_login_rehashes_password_below_policy(client, session, monkeypatch):
+    from fakeredis import FakeServer, aioredis
+    from passlib.hash import bcrypt
+
+    from src.services.auth import auth_service
+
+    server = FakeServer()
+    monkeypatch.setattr(auth_service, "pwd_context",
+                        auth_service.pwd_context.copy(bcrypt__default_rounds=5, bcrypt__min_rounds=5))
+    session.add(User(name="rehash", email="rehash@example.com", password=bcrypt.using(rounds=4).hash("123456789"),
+                     confirmed=True))
+    session.commit()
+    for _ in range(2):
+        # every request of this client runs in its own event loop, a redis client is bound to one
+        monkeypatch.setattr(auth_service, "redis_db", aioredis.FakeRedis(server=server))
+        response = client.post("/api/auth/login", data={"username": "rehash@example.com", "password": "123456789"})
+        assert response.status_code == 200, response.text
+    current_user: User = session.query(User).filter(User.email == "rehash@example.com").first()
+    assert bcrypt.from_string(current_user.password).rounds == 5
@@ -0,0 +1,129 @@
+"""
+    Soak test: drives the app in-process for SOAK_REQUESTS requests and fails when memory retained
+    between the first and the last tracemalloc snapshot grows past SOAK_MAX_GROWTH_KB.
+    Skipped unless SOAK_REQUESTS is set, e.g.
+
+        SOAK_REQUESTS=200000 python -m pytest -s tests/test_soak.py
+
+    Requests go straight to the ASGI app on one event loop, tracing allocations makes them
+    about three times slower, so expect around a hundred requests per second on SQLite.
+    """
+import asyncio
+import gc
+import os
+import tempfile
+import tracemalloc
+from typing import List
+from unittest.mock import patch
+
+import httpx
+from fakeredis import FakeServer, aioredis
+from pytest import fixture, mark
+from sqlalchemy import create_engine, text
+
+from main import app
+from src.conf.config import settings
+from src.database import connector
+from src.database.models import Base
+from src.jobs.generate_data import generate
+from src.services.auth import auth_service
+from src.services.note_batcher import note_batcher
+
+SOAK_REQUESTS = int(os.environ.get("SOAK_REQUESTS", 0))
+SOAK_SNAPSHOTS = int(os.environ.get("SOAK_SNAPSHOTS", 10))
+SOAK_WARMUP = int(os.environ.get("SOAK_WARMUP", 2000))
+SOAK_CONCURRENCY = int(os.environ.get("SOAK_CONCURRENCY", 10))
+SOAK_MAX_GROWTH_KB = float(os.environ.get("SOAK_MAX_GROWTH_KB", 1024))
+SOAK_TOP = int(os.environ.get("SOAK_TOP", 15))
+
+pytestmark = mark.skipif(not SOAK_REQUESTS, reason="set SOAK_REQUESTS to run the soak test")
+
+# allocations of the measurement itself and of imports are not leaks of the app
+SNAPSHOT_FILTERS = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen *>"),
+                    tracemalloc.Filter(False, "<unknown>"))
+
+
+@fixture(scope="module")
+def contact_ids():
+    # the real get_db and get_read_db sessions on a file database, fake redis for the auth cache
+    # and notes written through the note batcher
+    tmp = tempfile.TemporaryDirectory()
+    engine = create_engine(f"sqlite:///{os.path.join(tmp.name, 'soak.db')}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    generate(engine, users=1, contacts_per_user=20, notes_per_contact=3)
+    with engine.connect() as conn:
+        ids = conn.execute(text("SELECT id FROM contacts ORDER BY id")).scalars().all()
+    with patch.object(connector, "get_engine", lambda: engine), \
+            patch.object(auth_service, "redis_db", aioredis.FakeRedis(server=FakeServer())), \
+            patch.object(settings, "note_batch_enabled", True), \
+            patch.dict(app.dependency_overrides, clear=True):
+        yield ids
+    engine.dispose()
+    tmp.cleanup()
+
+
+async def drive(client: httpx.AsyncClient, contact_ids: List[int], requests: int) -> list:
+    """
+        send requests from SOAK_CONCURRENCY workers cycling through listing and reading contacts,
+        the current user, adding notes and a search
+
+        :return: responses that were not successful
+        :rtype: list
+        """
+    failures = []
+
+    async def worker(numbers: range) -> None:
+        for number in numbers:
+            contact_id = contact_ids[number % len(contact_ids)]
+            match number % 5:
+                case 0:
+                    response = await client.get("/api/contacts/", params={"limit": 10})
+                case 1:
+                    response = await client.get(f"/api/contacts/{contact_id}")
+                case 2:
+                    response = await client.get("/api/users/me/")
+                case 3:
+                    response = await client.post("/api/note/", json={"text": f"call back {number}",
+                                                                      "contact_id": contact_id})
+                case _:
+                    response = await client.get("/api/note/search", params={"q": "coffee"})
+            if response.status_code >= 400:
+                failures.append((response.request.method, response.request.url.path, response.status_code))
+
+    await asyncio.gather(*(worker(range(start, requests, SOAK_CONCURRENCY)) for start in range(SOAK_CONCURRENCY)))
+    return failures
+
+
+def retained(baseline: tracemalloc.Snapshot) -> List[tracemalloc.StatisticDiff]:
+    gc.collect()
+    return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS).compare_to(baseline, "lineno")
+
+
+async def soak(contact_ids: List[int]) -> tuple:
+    token = await auth_service.create_access_token({"sub": "user1@example.com"}, expires_delta=86400)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://soak",
+                                 headers={"Authorization": f"Bearer {token}"}) as client:
+        failures = await drive(client, contact_ids, SOAK_WARMUP)
+        tracemalloc.start()
+        try:
+            gc.collect()
+            baseline = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+            growth, per_snapshot = [], SOAK_REQUESTS // SOAK_SNAPSHOTS
+            for _ in range(SOAK_SNAPSHOTS):
+                failures += await drive(client, contact_ids, per_snapshot)
+                stats = retained(baseline)
+                growth.append(sum(stat.size_diff for stat in stats) / 1024)
+                print(f"retained growth after {len(growth) * per_snapshot} requests: {growth[-1]:.1f} KiB")
+        finally:
+            tracemalloc.stop()
+            await note_batcher.close()
+    return failures, growth, stats
+
+
+def test_memory_does_not_grow(contact_ids):
+    failures, growth, stats = asyncio.run(soak(contact_ids))
+    assert not failures, failures[:10]
+    top = "\n".join(str(stat) for stat in stats[:SOAK_TOP])
+    assert growth[-1] <= SOAK_MAX_GROWTH_KB, (
+        f"retained memory grew {growth[-1]:.1f} KiB over {SOAK_MAX_GROWTH_KB} KiB, "
+        f"per snapshot {[round(kib, 1) for kib in growth]}, top allocation sites:\n{top}")
@@ -0,0 +1,87 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import insert, select
+
+from src.database import connector
+from src.database.connector import ReplicaPool, RoutingSession
+from src.database.models import User
+
+
+class TestReplicaPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = ReplicaPool(["sqlite://", "sqlite://"], check_interval=60)
+
+    def test_round_robin(self):
+        first, second = self.pool.engines
+        self.assertEqual([self.pool.next() for _ in range(4)], [first, second, first, second])
+
+    def test_mark_down(self):
+        first, second = self.pool.engines
+        self.pool.mark_down(first)
+        self.assertEqual([self.pool.next() for _ in range(2)], [second, second])
+
+    def test_check_restores_replica(self):
+        first, _ = self.pool.engines
+        self.pool.mark_down(first)
+        self.pool.check()
+        self.assertIn(first, self.pool.healthy)
+
+    def test_no_replicas(self):
+        self.assertIsNone(ReplicaPool([], check_interval=60).next())
+
+    def test_run_checks_in_background(self):
+        first, _ = self.pool.engines
+        self.pool.mark_down(first)
+        self.pool.check_interval = 0
+
+        async def run_once():
+            task = asyncio.create_task(self.pool.run())
+            while first not in self.pool.healthy:
+                await asyncio.sleep(0.01)
+            task.cancel()
+
+        asyncio.run(asyncio.wait_for(run_once(), 5))
+
+
+class TestRoutingSession(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = ReplicaPool(["sqlite://"], check_interval=60)
+        self.replica = self.pool.engines[0]
+        patcher = patch.object(connector, "replicas", self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_read_only_reads_go_to_replica(self):
+        session = RoutingSession(read_only=True)
+        self.assertIs(session.get_bind(clause=select(User)), self.replica)
+
+    def test_session_keeps_its_replica(self):
+        self.pool = ReplicaPool(["sqlite://", "sqlite://"], check_interval=60)
+        with patch.object(connector, "replicas", self.pool):
+            session = RoutingSession(read_only=True)
+            replica = session.get_bind(clause=select(User))
+            self.assertEqual([session.get_bind(clause=select(User)) for _ in range(3)], [replica] * 3)
+            self.pool.mark_down(replica)
+            self.assertIsNot(session.get_bind(clause=select(User)), replica)
+
+    def test_default_session_uses_primary(self):
+        session = RoutingSession()
+        self.assertIs(session.get_bind(clause=select(User)), connector.get_engine())
+
+    def test_read_after_write_uses_primary(self):
+        session = RoutingSession(read_only=True)
+        self.assertIs(session.get_bind(clause=insert(User)), connector.get_engine())
+        self.assertIs(session.get_bind(clause=select(User)), connector.get_engine())
+
+    def test_no_healthy_replica_falls_back_to_primary(self):
+        self.pool.mark_down(self.replica)
+        session = RoutingSession(read_only=True)
+        self.assertIs(session.get_bind(clause=select(User)), connector.get_engine())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import datetime
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, select, text
+
+from src.database import connector, shards
+from src.database.connector import RoutingSession
+from src.database.models import Base, Contact, ShardDirectory, User
+from src.database.shards import HashRing, ShardRouter, create_shard_schema, parse_urls
+
+
+class TestHashRing(unittest.TestCase):
+
+    def test_keys_are_spread(self):
+        ring = HashRing(["a", "b", "c"])
+        owners = [ring.lookup(str(key)) for key in range(3000)]
+        for name in ("a", "b", "c"):
+            self.assertGreater(owners.count(name), 600)
+
+    def test_new_shard_moves_few_keys(self):
+        before, after = HashRing(["a", "b", "c"]), HashRing(["a", "b", "c", "d"])
+        moved = [key for key in range(3000) if before.lookup(str(key)) != after.lookup(str(key))]
+        self.assertLess(len(moved), 1200)
+        self.assertTrue(all(after.lookup(str(key)) == "d" for key in moved))
+
+    def test_parse_urls(self):
+        self.assertEqual(parse_urls("a=sqlite:///a.db?mode=ro, b=sqlite:///b.db"),
+                         {"a": "sqlite:///a.db?mode=ro", "b": "sqlite:///b.db"})
+        self.assertEqual(parse_urls(""), {})
+
+
+class TestShardRouting(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.primary = create_engine(f"sqlite:///{os.path.join(tmp.name, 'primary.db')}")
+        Base.metadata.create_all(self.primary, tables=[User.__table__, ShardDirectory.__table__])
+        self.router = ShardRouter({name: f"sqlite:///{os.path.join(tmp.name, name)}.db" for name in ("a", "b")},
+                                  directory_ttl=60)
+        self.addCleanup(self.router.dispose)
+        self.addCleanup(self.primary.dispose)
+        for engine in self.router.engines:
+            create_shard_schema(engine)
+        for patcher in (patch.object(connector, "get_engine", lambda: self.primary),
+                        patch.object(shards, "router", self.router)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        with RoutingSession() as session:
+            session.add(User(id=1, name="test", email="test@example.com", password="12345678"))
+            session.commit()
+
+    def add_contact(self, session):
+        session.add(Contact(first_name="John", last_name="Dow", email="john@example.com", phone="2877064128",
+                            birthday=datetime.datetime(1990, 4, 23), user_id=1))
+        session.commit()
+
+    def test_contacts_go_to_user_shard(self):
+        token = shards.current_user_id.set(1)
+        self.addCleanup(shards.current_user_id.reset, token)
+        with RoutingSession() as session:
+            self.add_contact(session)
+            self.assertEqual(session.query(User).one().id, 1)
+            self.assertEqual(session.execute(text("SELECT count(*) FROM contacts")).scalar(), 1)
+        home = self.router.ring.lookup("1")
+        with self.router.engine(home).connect() as conn:
+            self.assertEqual(conn.execute(select(Contact.email)).scalars().all(), ["john@example.com"])
+
+    def test_directory_overrides_ring(self):
+        other = "a" if self.router.ring.lookup("1") == "b" else "b"
+        with RoutingSession() as session:
+            self.router.assign(1, other, session)
+        with RoutingSession(info={"user_id": 1}) as session:
+            self.add_contact(session)
+        with RoutingSession(info={"shard": other}) as session:
+            self.assertEqual(session.query(Contact).count(), 1)
+
+    def test_without_user_stays_on_primary(self):
+        with RoutingSession() as session:
+            self.assertIs(session.get_bind(clause=select(Contact)), self.primary)
+
+
+if __name__ == '__main__':
+    unittest.main()
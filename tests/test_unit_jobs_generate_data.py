@@ -0,0 +1,107 @@
+import os
+import random
+import unittest
+from datetime import date
+
+from sqlalchemy import create_engine, text
+
+from src.database.models import Base
+from src.jobs.generate_data import birthday, generate, phone
+from src.schemas import ContactModel
+
+POSTGRES_URL = os.environ.get("GENERATE_DATA_POSTGRES_URL")
+
+
+class TestGenerateData(unittest.TestCase):
+
+    def engine(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        return engine
+
+    def rows(self, engine, query):
+        with engine.connect() as conn:
+            return conn.execute(text(query)).all()
+
+    def test_counts_are_consistent(self):
+        engine = self.engine()
+        counts = generate(engine, users=20, contacts_per_user=3, notes_per_contact=2, batch_size=7)
+        self.assertEqual(self.rows(engine, "SELECT COUNT(*) FROM users")[0][0], 20)
+        self.assertEqual(self.rows(engine, "SELECT COUNT(*) FROM contacts")[0][0], counts["contacts"])
+        self.assertEqual(self.rows(engine, "SELECT COUNT(*) FROM notes")[0][0], counts["notes"])
+        mismatched = self.rows(engine, "SELECT contacts.id FROM contacts LEFT JOIN notes ON notes.contact_id = "
+                                       "contacts.id GROUP BY contacts.id HAVING COUNT(notes.id) != notes_count")
+        self.assertEqual(mismatched, [])
+
+    def test_notes_are_searchable(self):
+        engine = self.engine()
+        counts = generate(engine, users=10, contacts_per_user=2, notes_per_contact=2)
+        self.assertEqual(self.rows(engine, "SELECT COUNT(*) FROM notes_fts")[0][0], counts["notes"])
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO notes (contact_id, text, user_id) VALUES (1, 'zeppelin', 1)"))
+        self.assertEqual(len(self.rows(engine, "SELECT rowid FROM notes_fts WHERE notes_fts MATCH 'zeppelin'")), 1)
+
+    def test_same_seed_same_rows(self):
+        first, second, other = self.engine(), self.engine(), self.engine()
+        for engine, seed in ((first, 1), (second, 1), (other, 2)):
+            generate(engine, users=10, contacts_per_user=2, notes_per_contact=1, seed=seed)
+        query = "SELECT * FROM contacts ORDER BY id"
+        self.assertEqual(self.rows(first, query), self.rows(second, query))
+        self.assertNotEqual(self.rows(first, query), self.rows(other, query))
+
+    def test_appends_after_existing_rows(self):
+        engine = self.engine()
+        generate(engine, users=5, contacts_per_user=1, notes_per_contact=1)
+        generate(engine, users=5, contacts_per_user=1, notes_per_contact=1)
+        self.assertEqual(self.rows(engine, "SELECT MAX(id), COUNT(*) FROM users")[0], (10, 10))
+
+    def test_contacts_are_valid(self):
+        rng = random.Random(0)
+        today = date(2023, 9, 1)
+        for _ in range(200):
+            contact = ContactModel(first_name="Olena", last_name="Melnyk", email="olena@example.com",
+                                   phone=phone(rng), birthday=birthday(rng, today))
+            self.assertLess(contact.birthday.date(), today)
+
+
+@unittest.skipUnless(POSTGRES_URL, "set GENERATE_DATA_POSTGRES_URL to a scratch Postgres database")
+class TestGenerateDataPostgres(TestGenerateData):
+    # the COPY path, the tables of the scratch database are dropped after each test
+
+    def engine(self):
+        engine = create_engine(POSTGRES_URL)
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        self.addCleanup(engine.dispose)
+        self.addCleanup(Base.metadata.drop_all, bind=engine)
+        return engine
+
+    def test_same_seed_same_rows(self):
+        # one scratch database, so the runs are compared one after another
+        query, rows = "SELECT * FROM contacts ORDER BY id", []
+        for seed in (1, 1, 2):
+            engine = self.engine()
+            generate(engine, users=10, contacts_per_user=2, notes_per_contact=1, seed=seed)
+            rows.append(self.rows(engine, query))
+        self.assertEqual(rows[0], rows[1])
+        self.assertNotEqual(rows[0], rows[2])
+
+    def test_notes_are_searchable(self):
+        engine = self.engine()
+        counts = generate(engine, users=10, contacts_per_user=2, notes_per_contact=2)
+        found = self.rows(engine, "SELECT COUNT(*) FROM notes WHERE text_search @@ plainto_tsquery('simple', 'coffee')")
+        self.assertEqual(found, self.rows(engine, "SELECT COUNT(*) FROM notes WHERE text LIKE '%coffee%'"))
+        self.assertGreater(counts["notes"], 0)
+
+    def test_sequences_follow_copied_ids(self):
+        engine = self.engine()
+        counts = generate(engine, users=5, contacts_per_user=1, notes_per_contact=1)
+        users = Base.metadata.tables["users"]
+        with engine.begin() as conn:
+            new_id = conn.execute(users.insert().values(name="new", email="new@example.com", password="x")
+                                  .returning(users.c.id)).scalar_one()
+        self.assertEqual(new_id, counts["users"] + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import io
+import json
+import logging
+import unittest
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+import src.database.connector  # noqa: F401 registers the database timing listeners
+from src.middleware.access_log import (AccessLogMiddleware, JsonFormatter, configure_logging, record, record_user,
+                                       route_template)
+from src.middleware.load_shedding import LoadSheddingMiddleware
+
+engine = create_engine("sqlite://")
+
+
+async def contact(request: Request):
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        conn.execute(text("SELECT 2"))
+    record("cache_hits")
+    record_user(7)
+    return JSONResponse(request.path_params)
+
+
+async def failed_statement():
+    with engine.connect() as conn:
+        try:
+            conn.execute(text("SELECT missing FROM nowhere"))
+        except OperationalError:
+            pass
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        return JSONResponse({"info": sorted(conn.connection.info)})
+
+
+async def failing():
+    return JSONResponse({"detail": "down"}, status_code=503)
+
+
+class Records(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, log_record):
+        self.records.append(log_record)
+
+
+class TestAccessLogMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = Records()
+        logging.getLogger("access").addHandler(self.handler)
+        logging.getLogger("access").setLevel(logging.INFO)
+
+    def client(self, sample_rates, load_shedding=False):
+        app = FastAPI()
+        app.add_api_route("/api/contacts/{contact_id}", contact)
+        app.add_api_route("/api/contacts/find/name/{contact_name}", contact)
+        app.add_api_route("/api/failing", failing)
+        app.add_api_route("/api/failed-statement", failed_statement)
+        if load_shedding:
+            # added first so it runs inside the access log, as in main.py
+            app.add_middleware(LoadSheddingMiddleware)
+        app.add_middleware(AccessLogMiddleware, sample_rates=sample_rates)
+        return TestClient(app)
+
+    def tearDown(self):
+        logging.getLogger("access").removeHandler(self.handler)
+
+    def access(self):
+        return [log_record.access for log_record in self.handler.records]
+
+    def test_request_fields(self):
+        self.client({}).get("/api/contacts/5")
+        entry, = self.access()
+        self.assertEqual(entry["route"], "/api/contacts/{contact_id}")
+        self.assertEqual(entry["path"], "/api/contacts/5")
+        self.assertEqual(entry["status"], 200)
+        self.assertEqual(entry["db_queries"], 2)
+        self.assertGreater(entry["db_ms"], 0)
+        self.assertEqual(entry["cache_hits"], 1)
+        self.assertEqual(entry["user_id"], 7)
+
+    def test_user_id_behind_load_shedding(self):
+        self.client({}, load_shedding=True).get("/api/contacts/5")
+        entry, = self.access()
+        self.assertEqual(entry["user_id"], 7)
+        self.assertEqual(entry["db_queries"], 2)
+
+    def test_route_is_template_of_matched_route(self):
+        client = self.client({})
+        client.get("/api/contacts/12")
+        client.get("/api/contacts/find/name/api")
+        client.get("/api/missing/1")
+        self.assertEqual([entry["route"] for entry in self.access()],
+                         ["/api/contacts/{contact_id}", "/api/contacts/find/name/{contact_name}", "/api/missing/1"])
+
+    def test_route_template_without_route(self):
+        self.assertEqual(route_template({"path": "/static/app.css"}), "/static/app.css")
+
+    def test_failed_statement_leaves_no_timing_behind(self):
+        response = self.client({}).get("/api/failed-statement")
+        self.assertEqual(response.json()["info"], [])
+        self.assertEqual(self.access()[0]["db_queries"], 1)
+
+    def test_sampling_keeps_errors(self):
+        client = self.client({"/api/contacts": 0.0, "/api/failing": 0.0})
+        client.get("/api/contacts/5")
+        client.get("/api/failing")
+        self.assertEqual([entry["status"] for entry in self.access()], [503])
+
+    def test_record_outside_of_request(self):
+        record("cache_hits")
+
+
+class TestQueueLogging(unittest.TestCase):
+
+    def test_records_are_written_by_listener(self):
+        stream = io.StringIO()
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(JsonFormatter())
+        root = logging.getLogger()
+        previous = root.handlers
+        listener = configure_logging(logging.INFO, handler)
+        try:
+            logging.getLogger("access").info("GET / 200", extra={"access": {"status": 200}})
+        finally:
+            listener.stop()
+        self.assertEqual(root.handlers, previous)
+        entry = json.loads(stream.getvalue())
+        self.assertEqual(entry["message"], "GET / 200")
+        self.assertEqual(entry["status"], 200)
+        self.assertEqual(entry["logger"], "access")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import gzip
+import json
+import unittest
+
+import brotli
+import zstandard
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import main
+from src.middleware.compression import CompressionMiddleware, negotiate, parse_levels
+
+ITEMS = [{"id": i, "first_name": "John", "last_name": "Dow"} for i in range(100)]
+
+
+async def items(request):
+    return JSONResponse(ITEMS)
+
+
+async def small(request):
+    return JSONResponse({"id": 1})
+
+
+async def image(request):
+    return Response(b"\x89PNG" * 1000, media_type="image/png")
+
+
+async def stream(request):
+    async def chunks():
+        for i in range(10):
+            yield f"line {i} ".encode() * 100
+    return StreamingResponse(chunks(), media_type="text/plain")
+
+
+class TestCompressionMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Starlette(routes=[Route("/items", items), Route("/small", small), Route("/image", image),
+                                     Route("/stream", stream)])
+        self.app.add_middleware(CompressionMiddleware, minimum_size=500)
+        self.client = TestClient(self.app)
+
+    def raw(self, path, encoding):
+        with self.client.stream("GET", path, headers={"Accept-Encoding": encoding}) as response:
+            return response, b"".join(response.iter_raw())
+
+    def middleware(self):
+        return self.app.middleware_stack.app
+
+    def test_negotiate(self):
+        encodings = ["br", "zstd", "gzip"]
+        self.assertEqual(negotiate("gzip, deflate, br", encodings), "br")
+        self.assertEqual(negotiate("gzip;q=1.0, br;q=0.5", encodings), "gzip")
+        self.assertEqual(negotiate("br;q=0, zstd", encodings), "zstd")
+        self.assertEqual(negotiate("*", encodings), "br")
+        self.assertIsNone(negotiate("identity", encodings))
+        self.assertIsNone(negotiate("", encodings))
+
+    def test_encodings(self):
+        decoders = {"gzip": gzip.decompress, "br": brotli.decompress,
+                    "zstd": lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data)}
+        for encoding, decode in decoders.items():
+            with self.subTest(encoding=encoding):
+                response, raw = self.raw("/items", encoding)
+                self.assertEqual(response.headers["Content-Encoding"], encoding)
+                self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+                self.assertEqual(int(response.headers["Content-Length"]), len(raw))
+                self.assertEqual(json.loads(decode(raw)), ITEMS)
+
+    def test_small_and_binary_bodies_are_not_compressed(self):
+        response = self.client.get("/small", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+        response = self.client.get("/image", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertNotIn("Vary", response.headers)
+
+    def test_streaming(self):
+        response, raw = self.raw("/stream", "gzip")
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertNotIn("Content-Length", response.headers)
+        self.assertEqual(gzip.decompress(raw), b"".join(f"line {i} ".encode() * 100 for i in range(10)))
+
+    def test_stats(self):
+        self.raw("/items", "gzip")
+        self.raw("/small", "gzip")
+        stats = self.middleware().stats
+        self.assertEqual(stats["responses"], 1)
+        self.assertEqual(stats["bytes_in"], len(json.dumps(ITEMS, separators=(",", ":"))))
+        self.assertGreater(stats["bytes_saved"], 0)
+
+    def test_stats_endpoint(self):
+        client = TestClient(main.app)
+        before = client.get("/stats").json()["compression"]
+        client.get("/openapi.json", headers={"Accept-Encoding": "gzip"})
+        after = client.get("/stats", headers={"Accept-Encoding": "identity"}).json()["compression"]
+        self.assertEqual(after["responses"], before["responses"] + 1)
+        self.assertGreater(after["bytes_saved"], before["bytes_saved"])
+
+    def test_parse_levels(self):
+        levels = parse_levels("application/json:gzip=1,text/csv:br=4")
+        self.assertEqual(levels["application/json"]["gzip"], 1)
+        self.assertEqual(levels["application/json"]["br"], 5)
+        self.assertEqual(levels["text/csv"], {"br": 4})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import MagicMock
+
+from starlette.testclient import TestClient
+
+import main
+
+from src.database.connector import apply_deadline
+from src.middleware import load_shedding
+from src.middleware.load_shedding import LoadSheddingMiddleware, parse_prefix_values
+
+
+class App:
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.deadlines = []
+
+    async def __call__(self, scope, receive, send):
+        self.deadlines.append(load_shedding.remaining())
+        await asyncio.sleep(self.delay)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def request(middleware, path="/api/contacts/"):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await middleware({"type": "http", "method": "GET", "path": path}, None, send)
+    start = messages[0]
+    return start["status"], dict(start["headers"]), messages[1]["body"]
+
+
+class TestLoadSheddingMiddleware(unittest.IsolatedAsyncioTestCase):
+
+    async def test_excess_requests_are_shed(self):
+        middleware = LoadSheddingMiddleware(App(), max_in_flight=2, max_queue=1, timeout=5)
+        results = await asyncio.gather(*(request(middleware) for _ in range(5)))
+        statuses = sorted(status for status, _, _ in results)
+        self.assertEqual(statuses, [200, 200, 200, 503, 503])
+        shed = next(headers for status, headers, _ in results if status == 503)
+        self.assertEqual(shed[b"retry-after"], b"1")
+        self.assertEqual(middleware.stats, {"in_flight": 0, "waiting": 0, "shed": 2, "timed_out": 0})
+
+    async def test_waiting_counts_against_deadline(self):
+        middleware = LoadSheddingMiddleware(App(delay=0.2), max_in_flight=1, max_queue=10, timeout=0.1)
+        results = await asyncio.gather(request(middleware), request(middleware))
+        self.assertEqual(sorted(status for status, _, _ in results), [503, 504])
+        self.assertEqual(middleware.in_flight, 0)
+
+    async def test_route_deadline_cancels_work(self):
+        app = App(delay=1)
+        middleware = LoadSheddingMiddleware(app, timeout=5,
+                                            route_timeouts=parse_prefix_values("/api/contacts/find=0.05"))
+        status, _, body = await request(middleware, "/api/contacts/find/")
+        self.assertEqual(status, 504)
+        self.assertEqual(json.loads(body), {"detail": "Request deadline exceeded"})
+        self.assertLessEqual(app.deadlines[0], 0.05)
+        self.assertEqual(middleware.stats["timed_out"], 1)
+
+    async def test_probes_are_exempt(self):
+        app = App(delay=0)
+        middleware = LoadSheddingMiddleware(app, max_in_flight=1, max_queue=0, timeout=5)
+        self.assertEqual((await request(middleware, "/readyz"))[0], 200)
+        self.assertEqual(app.deadlines, [None])
+
+
+class TestStatsEndpoint(unittest.TestCase):
+
+    def test_counters_of_the_app_middleware(self):
+        client = TestClient(main.app)
+        stats = client.get("/stats").json()["load_shedding"]
+        self.assertEqual(stats["in_flight"], 1)
+        middleware = main.find_middleware(main.app, LoadSheddingMiddleware)
+        middleware.shed += 1
+        self.addCleanup(setattr, middleware, "shed", middleware.shed - 1)
+        self.assertEqual(client.get("/stats").json()["load_shedding"]["shed"], stats["shed"] + 1)
+
+
+class TestStatementTimeout(unittest.TestCase):
+
+    def test_postgres_gets_remaining_deadline(self):
+        connection = MagicMock()
+        connection.dialect.name = "postgresql"
+        apply_deadline(None, None, connection)
+        connection.exec_driver_sql.assert_not_called()
+        token = load_shedding.deadline.set(load_shedding.time.monotonic() + 2)
+        try:
+            apply_deadline(None, None, connection)
+        finally:
+            load_shedding.deadline.reset(token)
+        statement = connection.exec_driver_sql.call_args.args[0]
+        self.assertRegex(statement, r"^SET LOCAL statement_timeout = (19\d\d|2000)$")
+        connection.dialect.name = "sqlite"
+        connection.exec_driver_sql.reset_mock()
+        token = load_shedding.deadline.set(load_shedding.time.monotonic() + 2)
+        try:
+            apply_deadline(None, None, connection)
+        finally:
+            load_shedding.deadline.reset(token)
+        connection.exec_driver_sql.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import asyncio
+import contextvars
+import sys
+import unittest
+from unittest.mock import patch
+
+from fakeredis import FakeServer, aioredis
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from starlette.background import BackgroundTask
+
+import src.database.connector  # noqa: F401 registers the statement listeners
+from src.middleware import tracing
+from src.middleware.tracing import (TracingMiddleware, configure_tracing, disable_tracing, in_memory_tracing, span,
+                                    traced)
+
+engine = create_engine("sqlite://")
+redis_db = aioredis.FakeRedis(server=FakeServer())
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+
+def send_mail(address):
+    with span("smtp send", address=address):
+        pass
+
+
+async def item(item_id: int):
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    await redis_db.set("item", 1)
+    return JSONResponse({"id": item_id},
+                        background=BackgroundTask(traced(send_mail), "john@example.com"))
+
+
+async def failing():
+    with engine.connect() as conn:
+        conn.execute(text("SELECT missing FROM nowhere"))
+
+
+class TestTracing(unittest.TestCase):
+
+    def setUp(self):
+        self.exporter = in_memory_tracing()
+        app = FastAPI()
+        app.add_api_route("/items/{item_id}", item)
+        app.add_api_route("/failing", failing)
+        app.add_middleware(TracingMiddleware)
+        self.client = TestClient(app, raise_server_exceptions=False)
+
+    def tearDown(self):
+        disable_tracing()
+
+    def spans(self):
+        return {finished.name: finished for finished in self.exporter.get_finished_spans()}
+
+    def test_request_spans(self):
+        self.client.get("/items/5", headers={"traceparent": f"00-{TRACE_ID}-00f067aa0ba902b7-01"})
+        spans = self.spans()
+        self.assertEqual(set(spans), {"GET /items/{item_id}", "SELECT", "redis SET", "background send_mail",
+                                      "smtp send"})
+        server = spans["GET /items/{item_id}"]
+        self.assertEqual(format(server.context.trace_id, "032x"), TRACE_ID)
+        self.assertEqual(server.attributes["http.status_code"], 200)
+        self.assertEqual(spans["SELECT"].parent.span_id, server.context.span_id)
+        self.assertEqual(spans["SELECT"].attributes["db.statement"], "SELECT 1")
+        self.assertEqual(spans["redis SET"].parent.span_id, server.context.span_id)
+        self.assertEqual(spans["smtp send"].parent.span_id, spans["background send_mail"].context.span_id)
+        self.assertEqual(spans["background send_mail"].context.trace_id, server.context.trace_id)
+
+    def test_failed_statement(self):
+        self.client.get("/failing")
+        spans = self.spans()
+        self.assertFalse(spans["SELECT"].status.is_ok)
+        self.assertFalse(spans["GET /failing"].status.is_ok)
+
+    def test_traced_task_in_fresh_context(self):
+        async def request():
+            with span("request") as current:
+                task = traced(lambda: span_id())
+                return current.get_span_context().span_id, await asyncio.create_task(
+                    asyncio.to_thread(task), context=contextvars.Context())
+
+        def span_id():
+            return tracing.trace.get_current_span().parent.span_id
+
+        request_id, parent_id = asyncio.run(request())
+        self.assertEqual(parent_id, request_id)
+
+    def test_otlp_without_exporter_package(self):
+        disable_tracing()
+        with patch.dict(sys.modules, {"opentelemetry.exporter.otlp.proto.http.trace_exporter": None}), \
+                self.assertLogs(level="WARNING"):
+            configure_tracing("otlp")
+        self.assertIsNone(tracing._tracer)
+
+    def test_noop_without_tracing(self):
+        disable_tracing()
+        with span("ignored") as current:
+            current.set_attribute("key", "value")
+        self.assertIs(traced(send_mail), send_mail)
+        self.assertEqual(self.exporter.get_finished_spans(), ())
+
+
+if __name__ == '__main__':
+    unittest.main()
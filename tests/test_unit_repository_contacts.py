@@ -1,9 +1,10 @@
 import unittest
 from unittest.mock import MagicMock, AsyncMock
+from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.models import User, Contact
+from src.database.models import Base, User, Contact, Note
 from src.schemas import ContactModel
 from src.repository.contacts import (
     create,
@@ -15,6 +16,9 @@ from src.repository.contacts import (
     find_by_email,
     find_by_lastname,
     find_birthday7day,
+    get_one_with_notes,
+    recount_notes,
+    upcoming_birthdays,
 )
 import datetime
 
@@ -42,7 +46,7 @@ class TestAsyncContacts(unittest.IsolatedAsyncioTestCase):
 
     async def test_get_all(self):
         contacts = [Contact()]
-        self.session.query().filter().offset().limit().all.return_value = contacts
+        self.session.query().filter().order_by().offset().limit().all.return_value = contacts
         result = await get_all(skip=0, limit=10, user=self.user, db=self.session)
         self.assertEqual(result, contacts)
 
@@ -87,5 +91,76 @@ class TestAsyncContacts(unittest.IsolatedAsyncioTestCase):
     # ... (other test methods)
 
 
+class SqliteContactsTestCase(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        self.session = Session(bind=engine)
+        self.session.add(User(id=1, name='test', email='test@example.com', password='12345678'))
+        for contact_id, notes_count in ((1, 0), (2, 5), (3, 1)):
+            self.session.add(Contact(id=contact_id, first_name='John', last_name='Dow',
+                                     email=f'john{contact_id}@example.com', phone='2877064128',
+                                     birthday=datetime.datetime(1990, 4, 23), user_id=1, notes_count=notes_count))
+        self.session.add_all([Note(contact_id=1, user_id=1, text='one'), Note(contact_id=1, user_id=1, text='two'),
+                              Note(contact_id=3, user_id=1, text='three')])
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+
+class TestRecountNotes(SqliteContactsTestCase):
+
+    async def test_recount_notes(self):
+        fixed = await recount_notes(db=self.session)
+        counts = {contact.id: contact.notes_count for contact in self.session.query(Contact)}
+        self.assertEqual(fixed, 2)
+        self.assertEqual(counts, {1: 2, 2: 0, 3: 1})
+
+
+class TestGetOneWithNotes(SqliteContactsTestCase):
+
+    async def test_latest_notes(self):
+        contact, notes = await get_one_with_notes(contact_id=1, notes_limit=1, user=User(id=1), db=self.session)
+        self.assertEqual(contact.id, 1)
+        self.assertEqual([note.text for note in notes], ['two'])
+
+    async def test_contact_without_notes(self):
+        contact, notes = await get_one_with_notes(contact_id=2, notes_limit=5, user=User(id=1), db=self.session)
+        self.assertEqual(contact.id, 2)
+        self.assertEqual(notes, [])
+
+    async def test_other_user(self):
+        contact, notes = await get_one_with_notes(contact_id=1, notes_limit=5, user=User(id=2), db=self.session)
+        self.assertIsNone(contact)
+
+
+class TestUpcomingBirthdays(SqliteContactsTestCase):
+
+    def add_contact(self, contact_id, birthday):
+        self.session.add(Contact(id=contact_id, first_name='Jane', last_name='Dow',
+                                 email=f'jane{contact_id}@example.com', phone='2877064128', birthday=birthday,
+                                 user_id=1))
+        self.session.commit()
+
+    async def test_next_seven_days(self):
+        self.add_contact(4, datetime.datetime(1985, 4, 30))
+        self.add_contact(5, datetime.datetime(1985, 5, 1))
+        contacts = await upcoming_birthdays(datetime.date(2023, 4, 23), 7, self.session)
+        self.assertEqual([contact.id for contact in contacts], [1, 2, 3, 4])
+
+    async def test_year_end(self):
+        self.add_contact(4, datetime.datetime(1985, 1, 2))
+        contacts = await upcoming_birthdays(datetime.date(2023, 12, 28), 7, self.session)
+        self.assertEqual([contact.id for contact in contacts], [4])
+
+    async def test_leap_day_in_common_year(self):
+        self.add_contact(4, datetime.datetime(1992, 2, 29))
+        contacts = await upcoming_birthdays(datetime.date(2023, 2, 25), 7, self.session)
+        self.assertEqual([contact.id for contact in contacts], [4])
+        self.assertEqual(contacts[0].user.email, 'test@example.com')
+
+
 if __name__ == '__main__':
     unittest.main()
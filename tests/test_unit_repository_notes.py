@@ -1,17 +1,21 @@
+import datetime
 import unittest
 
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
+from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
 
-from src.database.models import User, Note
+from src.database.models import Base, User, Contact, Note
 from src.schemas import NoteModel
+from src.repository import notes
 from src.repository.notes import (
     create,
     get_all,
     get_one,
     update,
     delete,
+    search,
 )
 
 
@@ -23,7 +27,7 @@ class TestNotes(unittest.IsolatedAsyncioTestCase):
 
     async def test_get_all(self):
         notes = [Note(), ]
-        self.session.query().filter().all.return_value = notes
+        self.session.query().filter().order_by().limit().all.return_value = notes
         result = await get_all(user=self.user, db=self.session)
         self.assertEqual(result, notes)
         self.assertListEqual(result, notes)
@@ -73,5 +77,100 @@ class TestNotes(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result, note)
 
 
+class SqliteNotesTestCase(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        self.session = Session(bind=engine)
+        self.user = User(id=1, name='test', email='test@example.com', password='12345678')
+        other = User(id=2, name='other', email='other@example.com', password='12345678')
+        self.session.add_all([self.user, other])
+        self.session.add_all([
+            Contact(id=1, first_name='John', last_name='Dow', email='john@example.com',
+                    phone='2877064128', birthday=datetime.datetime(1990, 4, 23), user_id=1),
+            Contact(id=2, first_name='Jane', last_name='Roe', email='jane@example.com',
+                    phone='2877064129', birthday=datetime.datetime(1991, 5, 2), user_id=1),
+        ])
+        self.session.add_all([
+            Note(id=1, contact_id=1, user_id=1, text='buy milk and bread',
+                 created_at=datetime.datetime(2023, 1, 1)),
+            Note(id=2, contact_id=1, user_id=1, text='call about the milk delivery, milk was late',
+                 created_at=datetime.datetime(2023, 2, 1)),
+            Note(id=3, contact_id=2, user_id=1, text='birthday party on friday',
+                 created_at=datetime.datetime(2023, 3, 1)),
+            Note(id=4, contact_id=1, user_id=2, text='milk for the other user',
+                 created_at=datetime.datetime(2023, 4, 1)),
+        ])
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+
+class TestNotesListing(SqliteNotesTestCase):
+
+    async def test_get_all_keyset_pages(self):
+        first = await get_all(user=self.user, db=self.session, limit=2)
+        second = await get_all(user=self.user, db=self.session, after_id=first[-1].id, limit=2)
+        self.assertEqual([note.id for note in first], [1, 2])
+        self.assertEqual([note.id for note in second], [3])
+
+    async def test_get_all_by_contact(self):
+        result = await get_all(user=self.user, db=self.session, contact_id=1)
+        self.assertEqual([note.id for note in result], [1, 2])
+
+    async def test_get_all_created_after(self):
+        result = await get_all(user=self.user, db=self.session, created_after=datetime.datetime(2023, 1, 15))
+        self.assertEqual([note.id for note in result], [2, 3])
+
+
+class TestNotesCounter(SqliteNotesTestCase):
+
+    async def test_create_increments_notes_count(self):
+        await create(body=NoteModel(contact_id=2, text="new"), user=self.user, db=self.session)
+        self.assertEqual(self.session.get(Contact, 2).notes_count, 1)
+
+    async def test_delete_decrements_notes_count(self):
+        note = await create(body=NoteModel(contact_id=2, text="new"), user=self.user, db=self.session)
+        await delete(note_id=note.id, user=self.user, db=self.session)
+        self.assertEqual(self.session.get(Contact, 2).notes_count, 0)
+
+    async def test_delete_leaves_contacts_of_other_users(self):
+        other = self.session.get(User, 2)
+        await delete(note_id=4, user=other, db=self.session)
+        self.assertIsNone(self.session.get(Note, 4))
+        self.assertEqual(self.session.get(Contact, 1).notes_count, 0)
+
+
+class TestNotesSearch(SqliteNotesTestCase):
+
+    async def test_search_ranked_and_scoped_to_user(self):
+        result = await search(query='milk', skip=0, limit=10, user=self.user, db=self.session)
+        self.assertEqual([hit["id"] for hit in result], [2, 1])
+        self.assertIn('<b>milk</b>', result[0]["snippet"])
+
+    async def test_search_paginated(self):
+        result = await search(query='milk', skip=1, limit=1, user=self.user, db=self.session)
+        self.assertEqual([hit["id"] for hit in result], [1])
+
+    async def test_search_follows_updates(self):
+        note = self.session.get(Note, 3)
+        note.text = 'milk party'
+        self.session.commit()
+        result = await search(query='birthday', skip=0, limit=10, user=self.user, db=self.session)
+        self.assertEqual(result, [])
+
+    async def test_search_query_syntax_is_escaped(self):
+        result = await search(query='milk" OR "bread', skip=0, limit=10, user=self.user, db=self.session)
+        self.assertEqual(result, [])
+
+    async def test_search_without_full_text_index(self):
+        with patch.dict(notes.SEARCH_SQL, clear=True):
+            result = await search(query='MILK bread', skip=0, limit=10, user=self.user, db=self.session)
+            self.assertEqual([(hit["id"], hit["snippet"]) for hit in result], [(1, 'buy milk and bread')])
+            self.assertEqual(await search(query='mi%k', skip=0, limit=10, user=self.user, db=self.session), [])
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,72 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from gunicorn.config import Config
+from gunicorn.glogging import Logger
+
+from main import parse_args
+from src import server
+from src.server import ProductionWorker, run_production
+
+PRODUCTION = {"host": "0.0.0.0", "port": 8000, "workers": 2, "keep_alive": 5, "backlog": 2048,
+              "limit_concurrency": None, "graceful_timeout": 30, "preload": False}
+
+
+class TestParseArgs(unittest.TestCase):
+
+    def test_defaults(self):
+        args = parse_args([])
+        self.assertFalse(args.prod)
+        self.assertIsNone(args.limit_concurrency)
+        self.assertFalse(args.preload)
+
+    def test_production_options(self):
+        args = parse_args(["--prod", "--workers", "3", "--limit-concurrency", "50", "--keep-alive", "10",
+                           "--backlog", "64", "--graceful-timeout", "5", "--preload"])
+        self.assertTrue(args.prod)
+        self.assertEqual((args.workers, args.limit_concurrency, args.keep_alive, args.backlog,
+                          args.graceful_timeout), (3, 50, 10, 64, 5))
+        self.assertTrue(args.preload)
+
+
+class TestRunProduction(unittest.TestCase):
+
+    def options(self, **kwargs):
+        with patch.object(server, "ProductionServer") as production_server:
+            run_production(**{**PRODUCTION, **kwargs})
+        return production_server.call_args.args[0]
+
+    def test_gunicorn_options(self):
+        options = self.options(preload=True)
+        self.assertEqual(options["bind"], "0.0.0.0:8000")
+        self.assertEqual(options["workers"], 2)
+        self.assertEqual(options["worker_class"], "src.server.ProductionWorker")
+        self.assertTrue(options["preload_app"])
+        self.assertNotIn("worker_connections", options)
+
+    def test_limit_concurrency(self):
+        self.assertEqual(self.options(limit_concurrency=50)["worker_connections"], 50)
+
+    def test_uvicorn_without_gunicorn(self):
+        with patch.object(server, "UvicornWorker", None), patch.object(server.uvicorn, "run") as run:
+            run_production(**PRODUCTION)
+        self.assertIsNone(run.call_args.kwargs["limit_concurrency"])
+        self.assertEqual(run.call_args.kwargs["workers"], 2)
+
+
+class TestProductionWorker(unittest.TestCase):
+
+    def worker(self, options):
+        cfg = Config()
+        app = MagicMock(options=options)
+        return ProductionWorker(0, 0, [], app, 30, cfg, Logger(cfg))
+
+    def test_no_limit_by_default(self):
+        self.assertIsNone(self.worker({}).config.limit_concurrency)
+
+    def test_limit_from_options(self):
+        self.assertEqual(self.worker({"worker_connections": 50}).config.limit_concurrency, 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+from src.jobs.precompress_static import precompress
+from src.services.assets import IMMUTABLE, REVALIDATE, HashedStaticFiles, parse_range
+
+SCRIPT = b"console.log('hello');\n" * 200
+
+
+class TestHashedStaticFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.directory.name, "app.js"), "wb") as fh:
+            fh.write(SCRIPT)
+        with open(os.path.join(self.directory.name, "one.png"), "wb") as fh:
+            fh.write(bytes(range(256)))
+        self.assertEqual(precompress(self.directory.name), 2)
+        self.static = HashedStaticFiles(directory=self.directory.name)
+        self.client = TestClient(Starlette(routes=[Mount("/static", self.static, name="static")]))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get(self, path, **headers):
+        with self.client.stream("GET", path, headers={"Accept-Encoding": "identity", **headers}) as response:
+            return response, b"".join(response.iter_raw())
+
+    def test_hashed_url_is_immutable(self):
+        path = self.static.asset_path("one.png")
+        self.assertRegex(path, r"^one\.[0-9a-f]{12}\.png$")
+        response, body = self.get(f"/static/{path}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, bytes(range(256)))
+        self.assertEqual(response.headers["Cache-Control"], IMMUTABLE)
+        self.assertEqual(response.headers["Content-Type"], "image/png")
+
+    def test_plain_url_is_revalidated(self):
+        response, _ = self.get("/static/one.png")
+        self.assertEqual(response.headers["Cache-Control"], REVALIDATE)
+        response, body = self.get("/static/one.png", **{"If-None-Match": response.headers["ETag"]})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.get("/static/missing.png")[0].status_code, 404)
+
+    def test_precompressed_variant(self):
+        response, body = self.get(f"/static/{self.static.asset_path('app.js')}", **{"Accept-Encoding": "gzip"})
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+        self.assertIn("javascript", response.headers["Content-Type"])
+        self.assertEqual(gzip.decompress(body), SCRIPT)
+        self.assertIn("br", self.static.manifest["app.js"].variants)
+
+    def test_range(self):
+        response, body = self.get("/static/one.png", Range="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, bytes(range(10, 20)))
+        self.assertEqual(response.headers["Content-Range"], "bytes 10-19/256")
+        self.assertEqual(response.headers["Content-Length"], "10")
+        response, body = self.get("/static/one.png", Range="bytes=-6")
+        self.assertEqual(body, bytes(range(250, 256)))
+        response, _ = self.get("/static/one.png", Range="bytes=300-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response.headers["Content-Range"], "bytes */256")
+        response, body = self.get("/static/one.png", Range="bytes=0-1", **{"If-Range": '"stale"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(body), 256)
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range("bytes=0-", 100), (0, 100))
+        self.assertEqual(parse_range("bytes=90-200", 100), (90, 10))
+        self.assertIsNone(parse_range("bytes=0-1,5-6", 100))
+        with self.assertRaises(ValueError):
+            parse_range("bytes=5-1", 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from fakeredis import FakeServer, aioredis
+from fastapi import HTTPException
+
+from src.conf.config import settings
+from src.database.models import User
+from src.services.auth import Auth, Principal
+
+
+class TestRefreshTokens(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.auth = Auth()
+        self.auth.redis_db = aioredis.FakeRedis(server=FakeServer())
+
+    async def test_rotation(self):
+        token = await self.auth.create_refresh_token({"sub": "test@example.com"})
+        email, family = await self.auth.use_refresh_token(token)
+        rotated = await self.auth.create_refresh_token({"sub": email}, family=family)
+        self.assertEqual(email, "test@example.com")
+        self.assertEqual(await self.auth.use_refresh_token(rotated), (email, family))
+
+    async def test_reuse_revokes_family(self):
+        token = await self.auth.create_refresh_token({"sub": "test@example.com"})
+        email, family = await self.auth.use_refresh_token(token)
+        rotated = await self.auth.create_refresh_token({"sub": email}, family=family)
+        with self.assertRaises(HTTPException) as err:
+            await self.auth.use_refresh_token(token)
+        self.assertEqual(err.exception.status_code, 401)
+        with self.assertRaises(HTTPException):
+            await self.auth.use_refresh_token(rotated)
+
+    async def test_revoke_user(self):
+        first = await self.auth.create_refresh_token({"sub": "test@example.com"})
+        second = await self.auth.create_refresh_token({"sub": "test@example.com"})
+        other = await self.auth.create_refresh_token({"sub": "other@example.com"})
+        await self.auth.revoke_refresh_tokens("test@example.com")
+        for token in (first, second):
+            with self.assertRaises(HTTPException):
+                await self.auth.use_refresh_token(token)
+        self.assertEqual((await self.auth.use_refresh_token(other))[0], "other@example.com")
+
+    async def test_access_token_is_not_refresh_token(self):
+        token = await self.auth.create_access_token({"sub": "test@example.com"})
+        with self.assertRaises(HTTPException):
+            await self.auth.use_refresh_token(token)
+
+
+class TestAccessTokenRevocation(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.auth = Auth()
+        self.auth.redis_db = aioredis.FakeRedis(server=FakeServer())
+
+    async def test_revoked_token_rejected(self):
+        token = await self.auth.create_access_token({"sub": "test@example.com"})
+        await self.auth.revoke_access_token(token)
+        with self.assertRaises(HTTPException) as err:
+            await self.auth.get_current_user(token=token, db=MagicMock())
+        self.assertEqual(err.exception.status_code, 401)
+
+
+class TestStatelessAuth(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.auth = Auth()
+        self.auth.redis_db = aioredis.FakeRedis(server=FakeServer())
+        self.auth.token_versions.versions.clear()
+        self.user = User(id=1, name="test", email="test@example.com", confirmed=True)
+        patcher = patch.object(settings, "auth_stateless", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_principal_from_claims(self):
+        token = await self.auth.create_access_token(await self.auth.access_claims(self.user))
+        db = MagicMock()
+        principal = await self.auth.get_current_principal(token=token, db=db)
+        self.assertEqual(principal, Principal(id=1, name="test", email="test@example.com", confirmed=True))
+        db.query.assert_not_called()
+
+    async def test_bumped_version_rejects_old_tokens(self):
+        old = await self.auth.create_access_token(await self.auth.access_claims(self.user))
+        await self.auth.bump_token_version(self.user.id)
+        with self.assertRaises(HTTPException) as err:
+            await self.auth.get_current_principal(token=old, db=MagicMock())
+        self.assertEqual(err.exception.status_code, 401)
+        new = await self.auth.create_access_token(await self.auth.access_claims(self.user))
+        self.assertEqual((await self.auth.get_current_principal(token=new, db=MagicMock())).id, 1)
+
+    async def test_bump_is_seen_by_other_workers_after_sync(self):
+        token = await self.auth.create_access_token(await self.auth.access_claims(self.user))
+        await self.auth.redis_db.hincrby("token_versions", self.user.id, 1)
+        self.assertEqual((await self.auth.get_current_principal(token=token, db=MagicMock())).id, 1)
+        await self.auth.token_versions.sync(self.auth.redis_db)
+        with self.assertRaises(HTTPException):
+            await self.auth.get_current_principal(token=token, db=MagicMock())
+
+
+class TestPasswordHash(unittest.TestCase):
+
+    def setUp(self):
+        self.auth = Auth()
+
+    def test_calibration_respects_bounds(self):
+        self.assertEqual(self.auth.calibrate_password_hash(target_ms=0, min_rounds=4, max_rounds=6), 4)
+        self.assertEqual(self.auth.calibrate_password_hash(target_ms=10 ** 6, min_rounds=4, max_rounds=6), 6)
+        self.assertIn("$2b$06$", self.auth.get_hash("secret"))
+
+    def test_weak_hash_is_rehashed(self):
+        self.auth.calibrate_password_hash(target_ms=0, min_rounds=4, max_rounds=4)
+        weak = self.auth.get_hash("secret")
+        self.auth.calibrate_password_hash(target_ms=0, min_rounds=5, max_rounds=5)
+        valid, new_hash = self.auth.verify_and_update("secret", weak)
+        self.assertTrue(valid)
+        self.assertIn("$2b$05$", new_hash)
+        self.assertEqual(self.auth.verify_and_update("secret", new_hash), (True, None))
+        self.assertEqual(self.auth.verify_and_update("wrong", new_hash), (False, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import datetime
+import json
+import unittest
+from unittest.mock import patch
+
+from fakeredis import FakeServer, aioredis
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from src.database.models import Base, Contact, User
+from src.jobs.birthday_digest import build_digest
+from src.repository import contacts as repository_contact
+from src.services import birthdays
+
+
+class TestBirthdayDigest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        self.session = Session(bind=engine)
+        self.redis = aioredis.FakeRedis(server=FakeServer())
+        self.today = datetime.date.today()
+        for user_id in (1, 2, 3):
+            self.session.add(User(id=user_id, name='test', email=f'test{user_id}@example.com', password='12345678'))
+        for contact_id, user_id, shift in ((1, 1, 1), (2, 1, 30), (3, 2, 30)):
+            birthday = datetime.datetime.combine(self.today + datetime.timedelta(days=shift), datetime.time.min)
+            self.session.add(Contact(id=contact_id, first_name='John', last_name='Dow',
+                                     email=f'john{contact_id}@example.com', phone='2877064128',
+                                     birthday=birthday.replace(year=2000),
+                                     user_id=user_id))
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    async def test_served_from_digest(self):
+        self.assertIsNone(await birthdays.get_cached(1, self.redis))
+        self.assertEqual(await build_digest(self.today, [self.session], self.redis), 1)
+        contacts = json.loads(await birthdays.get_cached(1, self.redis))
+        self.assertEqual([contact["id"] for contact in contacts], [1])
+        self.assertEqual(await birthdays.get_cached(2, self.redis), b"[]")
+        self.assertGreater(await self.redis.ttl(birthdays.digest_key(self.today)), 0)
+
+    async def test_invalidate(self):
+        await build_digest(self.today, [self.session], self.redis)
+        await birthdays.invalidate(1, self.redis)
+        await birthdays.invalidate(3, self.redis)
+        self.assertIsNone(await birthdays.get_cached(1, self.redis))
+        self.assertIsNone(await birthdays.get_cached(3, self.redis))
+        self.assertEqual(await birthdays.get_cached(2, self.redis), b"[]")
+
+    async def test_invalidation_during_build_survives(self):
+        upcoming_birthdays = repository_contact.upcoming_birthdays
+
+        async def changed_while_querying(*args):
+            result = await upcoming_birthdays(*args)
+            await birthdays.invalidate(1, self.redis)
+            return result
+
+        with patch.object(repository_contact, "upcoming_birthdays", changed_while_querying):
+            await build_digest(self.today, [self.session], self.redis)
+        self.assertIsNone(await birthdays.get_cached(1, self.redis))
+        self.assertEqual(await birthdays.get_cached(2, self.redis), b"[]")
+
+    async def test_rebuild_serves_users_invalidated_before(self):
+        await birthdays.invalidate(1, self.redis)
+        await build_digest(self.today, [self.session], self.redis)
+        contacts = json.loads(await birthdays.get_cached(1, self.redis))
+        self.assertEqual([contact["id"] for contact in contacts], [1])
+        self.assertFalse(await self.redis.exists(f"{birthdays.digest_key(self.today)}:building"))
+
+    async def test_without_redis(self):
+        self.assertIsNone(await birthdays.get_cached(1, None))
+        await birthdays.invalidate(1, None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import asyncio
+import pickle
+import time
+import unittest
+
+from fakeredis import FakeServer, aioredis
+
+from src.services.cache import EarlyRefreshCache, SingleFlight
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+
+    async def test_concurrent_calls_share_one_fetch(self):
+        flight, calls = SingleFlight(), []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "value"
+
+        results = await asyncio.gather(*(flight.do("key", fetch) for _ in range(10)))
+        self.assertEqual(results, ["value"] * 10)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.coalesced, 9)
+        self.assertEqual(await flight.do("key", fetch), "value")
+        self.assertEqual(len(calls), 2)
+
+    async def test_error_is_shared(self):
+        flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise ValueError("db is down")
+
+        results = await asyncio.gather(*(flight.do("key", fetch) for _ in range(3)), return_exceptions=True)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+    async def test_cancelled_caller_does_not_cancel_others(self):
+        flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            return "value"
+
+        first = asyncio.ensure_future(flight.do("key", fetch))
+        second = asyncio.ensure_future(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        self.assertEqual(await second, "value")
+
+
+class TestEarlyRefreshCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.redis = aioredis.FakeRedis(server=FakeServer())
+        self.cache = EarlyRefreshCache(ttl=60)
+        self.calls = 0
+
+    async def fetch(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return {"id": 1}
+
+    async def test_miss_then_hit(self):
+        self.assertEqual(await self.cache.get(self.redis, "user:1", self.fetch), {"id": 1})
+        self.assertEqual(await self.cache.get(self.redis, "user:1", self.fetch), {"id": 1})
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.cache.stats, {"hits": 1, "misses": 1, "early_refreshes": 0, "coalesced": 0})
+
+    async def test_concurrent_misses_coalesce(self):
+        await asyncio.gather(*(self.cache.get(self.redis, "user:1", self.fetch) for _ in range(5)))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.cache.stats["coalesced"], 4)
+
+    async def test_refresh_near_expiry(self):
+        entry = {"value": {"id": 0}, "delta": 10.0, "expiry": time.time() + 0.001}
+        await self.redis.set("user:1", pickle.dumps(entry), ex=60)
+        self.assertEqual(await self.cache.get(self.redis, "user:1", self.fetch), {"id": 1})
+        self.assertEqual(self.cache.early_refreshes, 1)
+
+    async def test_none_is_not_stored(self):
+        async def fetch():
+            return None
+
+        self.assertIsNone(await self.cache.get(self.redis, "user:1", fetch))
+        self.assertFalse(await self.redis.exists("user:1"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import datetime
+import json
+import unittest
+
+from fastapi import HTTPException
+
+from src.database.models import Contact
+from src.schemas import ContactResponse
+from src.services.fieldsets import fieldset, sparse_adapter, sparse_response
+
+
+class TestFieldsets(unittest.TestCase):
+
+    def setUp(self):
+        self.parse = fieldset(ContactResponse)
+
+    def test_parse_keeps_model_order_and_id(self):
+        self.assertEqual(self.parse("last_name,first_name"), ("first_name", "last_name", "id"))
+        self.assertIsNone(self.parse(None))
+
+    def test_unknown_field(self):
+        with self.assertRaises(HTTPException) as err:
+            self.parse("first_name,password")
+        self.assertEqual(err.exception.status_code, 422)
+
+    def test_sparse_response(self):
+        contact = Contact(id=1, first_name="John", last_name="Dow", email="john@example.com", phone="2877064128",
+                          birthday=datetime.datetime(1990, 4, 23))
+        response = sparse_response(ContactResponse, ("first_name", "id"), [contact], headers={"X-Next-Cursor": "1"})
+        self.assertEqual(json.loads(response.body), [{"first_name": "John", "id": 1}])
+        self.assertEqual(response.headers["X-Next-Cursor"], "1")
+
+    def test_models_are_cached(self):
+        self.assertIs(sparse_adapter(ContactResponse, ("id",)), sparse_adapter(ContactResponse, ("id",)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from fakeredis import FakeServer, aioredis
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+from src.services.health import HealthMonitor, pool_saturation
+
+
+class TestHealthMonitor(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.directory.name, 'health.db')}",
+                                    poolclass=QueuePool, pool_size=2, max_overflow=2)
+        self.server = FakeServer()
+        self.redis = aioredis.FakeRedis(server=self.server)
+        self.monitor = HealthMonitor(interval=5, timeout=1, max_saturation=0.75, engines=lambda: [self.engine])
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.directory.cleanup()
+
+    async def test_not_ready_before_first_check(self):
+        self.assertFalse(self.monitor.ready)
+        self.assertEqual(self.monitor.report["status"], "unavailable")
+
+    async def test_ready(self):
+        report = await self.monitor.check(self.redis)
+        self.assertTrue(self.monitor.ready)
+        self.assertEqual(report["status"], "ok")
+        self.assertEqual(report["checks"]["pool"]["saturation"], 0.0)
+
+    async def test_redis_down(self):
+        self.server.connected = False
+        report = await self.monitor.check(self.redis)
+        self.assertFalse(report["checks"]["redis"]["ok"])
+        self.assertTrue(report["checks"]["database"]["ok"])
+        report = await self.monitor.check(None)
+        self.assertEqual(report["status"], "unavailable")
+
+    async def test_saturated_pool(self):
+        connections = [self.engine.connect() for _ in range(3)]
+        try:
+            self.assertEqual(pool_saturation(self.engine), 0.75)
+            report = await self.monitor.check(self.redis)
+            self.assertFalse(report["checks"]["pool"]["ok"])
+        finally:
+            for conn in connections:
+                conn.close()
+
+    async def test_stale_result(self):
+        await self.monitor.check(self.redis)
+        self.monitor.checked_at -= 3 * self.monitor.interval + 1
+        self.assertFalse(self.monitor.ready)
+
+    async def test_run_refreshes(self):
+        self.monitor.interval = 0.01
+        task = asyncio.create_task(self.monitor.run(self.redis))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        self.assertTrue(self.monitor.ready)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import asyncio
+import datetime
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, Contact, User
+from src.schemas import NoteModel
+from src.services.note_batcher import NoteWriteBatcher
+
+
+class TestNoteWriteBatcher(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=self.engine)
+        self.user = User(id=1)
+        with Session(bind=self.engine) as session:
+            session.add(User(id=1, name='test', email='test@example.com', password='12345678'))
+            for contact_id in (1, 2):
+                session.add(Contact(id=contact_id, first_name='John', last_name='Dow',
+                                    email=f'john{contact_id}@example.com', phone='2877064128',
+                                    birthday=datetime.datetime(1990, 4, 23), user_id=1))
+            session.commit()
+        self.batcher = NoteWriteBatcher(max_delay_ms=5, max_batch=100,
+                                        session_factory=lambda _: Session(bind=self.engine, expire_on_commit=False))
+
+    def notes_count(self):
+        with Session(bind=self.engine) as session:
+            return {contact.id: contact.notes_count for contact in session.query(Contact)}
+
+    async def test_concurrent_notes_share_one_batch(self):
+        bodies = [NoteModel(text=f'note {i}', contact_id=1 + i % 2) for i in range(5)]
+        notes = await asyncio.gather(*(self.batcher.submit(body, self.user) for body in bodies))
+        self.assertEqual([note.text for note in notes], [body.text for body in bodies])
+        self.assertEqual(len({note.id for note in notes}), 5)
+        self.assertEqual([note.contact.id for note in notes], [1, 2, 1, 2, 1])
+        self.assertEqual(self.notes_count(), {1: 3, 2: 2})
+        self.assertEqual(self.batcher.stats["batches"], 1)
+        self.assertEqual(self.batcher.stats["batch_sizes"]["<=16"], 1)
+
+    async def test_bad_note_fails_alone(self):
+        bad = NoteModel.model_construct(text='bad', contact_id=None)
+        good, failed = await asyncio.gather(self.batcher.submit(NoteModel(text='good', contact_id=1), self.user),
+                                            self.batcher.submit(bad, self.user), return_exceptions=True)
+        self.assertEqual(good.text, 'good')
+        self.assertIsInstance(failed, IntegrityError)
+        self.assertEqual(self.notes_count(), {1: 1, 2: 0})
+
+    async def test_full_batch_is_written_without_delay(self):
+        self.batcher.max_delay, self.batcher.max_batch = 60, 3
+        bodies = [NoteModel(text=f'note {i}', contact_id=1) for i in range(3)]
+        notes = await asyncio.wait_for(asyncio.gather(*(self.batcher.submit(body, self.user) for body in bodies)), 5)
+        self.assertEqual(len(notes), 3)
+        self.assertEqual(self.batcher.largest_batch, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import time
+import unittest
+
+from fakeredis import FakeServer, aioredis
+
+from src.services.revocation import BloomFilter, RevocationList
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        items = [f"token-{i}" for i in range(1000)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in items))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"token-{i}")
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class TestRevocationList(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.redis = aioredis.FakeRedis(server=FakeServer())
+        self.revocation = RevocationList(capacity=1000, error_rate=0.01, sync_interval=5)
+
+    async def test_revoke(self):
+        await self.revocation.revoke("revoked", time.time() + 60, self.redis)
+        self.assertTrue(await self.revocation.is_revoked("revoked", self.redis))
+        self.assertFalse(await self.revocation.is_revoked("valid", self.redis))
+        self.assertGreater(await self.redis.zscore(RevocationList.KEY, "revoked"), time.time())
+
+    async def test_expired_token_is_not_stored(self):
+        await self.revocation.revoke("expired", time.time() - 1, self.redis)
+        self.assertIsNone(await self.redis.zscore(RevocationList.KEY, "expired"))
+
+    async def test_expired_revocation_is_not_revoked(self):
+        await self.redis.zadd(RevocationList.KEY, {"expired": time.time() - 1})
+        self.revocation.filter.add("expired")
+        self.assertFalse(await self.revocation.is_revoked("expired", self.redis))
+
+    async def test_sync_sees_other_workers(self):
+        other_worker = RevocationList(capacity=1000, error_rate=0.01, sync_interval=5)
+        await other_worker.revoke("revoked", time.time() + 60, self.redis)
+        self.assertFalse(await self.revocation.is_revoked("revoked", self.redis))
+        await self.revocation.sync(self.redis)
+        self.assertTrue(await self.revocation.is_revoked("revoked", self.redis))
+
+    async def test_sync_prunes_expired(self):
+        await self.redis.zadd(RevocationList.KEY, {"expired": time.time() - 1, "live": time.time() + 60})
+        await self.revocation.sync(self.redis)
+        self.assertEqual(await self.redis.zrange(RevocationList.KEY, 0, -1), [b"live"])
+        self.assertIn("live", self.revocation.filter)
+        self.assertNotIn("expired", self.revocation.filter)
+
+
+if __name__ == '__main__':
+    unittest.main()